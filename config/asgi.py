@@ -0,0 +1,9 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Для async-версий view: uvicorn config.asgi:application с ASYNC_VIEWS=True
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
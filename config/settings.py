@@ -1,16 +1,18 @@
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = config('SECRET_KEY', default='12345')
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 LANGUAGE_CODE = 'ru'
 USE_I18N = True
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 ROOT_URLCONF = 'config.urls'
+WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -24,7 +26,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'courses.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'courses.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -35,6 +39,14 @@ MIDDLEWARE = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Под ASGI прохождение теста, кабинет и API тестов обслуживают async-версии view
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Пул psycopg несовместим с постоянными соединениями: либо пул, либо CONN_MAX_AGE.
+# Под ASGI постоянные соединения выключены: каждый поток sync_to_async держал бы своё
+# соединение до упора в max_connections, для переиспользования там нужен DB_POOL
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -43,15 +55,55 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='dbpass'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL or ASYNC_VIEWS else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Реплика для чтения: страницы, помеченные replica_reads, читают с неё
+REPLICA_DATABASE = None
+if config('DB_REPLICA_HOST', default=''):
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'HOST': config('DB_REPLICA_HOST'),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+DATABASE_ROUTERS = ['courses.routers.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='course-platform'),
+    }
+}
+# Фрагменты шаблонов ({% cache %}) живут отдельно, ключи содержат версии курса и теста
+CACHES['template_fragments'] = {**CACHES['default'], 'KEY_PREFIX': 'fragments'}
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Без DEBUG шаблоны компилируются один раз на процесс
+TEMPLATE_CACHED_LOADER = config('TEMPLATE_CACHED_LOADER', default=not DEBUG, cast=bool)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if TEMPLATE_CACHED_LOADER
+            else TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -67,6 +119,25 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Живая аналитика блокирует строку QuizStats теста в транзакции сдачи и выстраивает все сдачи
+# одного теста в очередь. По умолчанию агрегаты пересчитывает compact_quiz_analytics по расписанию
+QUIZ_ANALYTICS_LIVE = config('QUIZ_ANALYTICS_LIVE', default=False, cast=bool)
+# Режим экзамена: сдачи пишутся одной строкой в буфер, результаты переносит drain_submissions
+QUIZ_SUBMISSION_BUFFER = config('QUIZ_SUBMISSION_BUFFER', default=False, cast=bool)
+# Компактное хранение: ответы упакованы в QuizResult, строки QuizAttempt можно не писать вовсе,
+# а старше QUIZ_ATTEMPT_HOT_DAYS дней archive_attempts переносит их в архив
+QUIZ_ATTEMPT_ROWS = config('QUIZ_ATTEMPT_ROWS', default=True, cast=bool)
+QUIZ_ATTEMPT_HOT_DAYS = config('QUIZ_ATTEMPT_HOT_DAYS', default=90, cast=int)
+GRADING_WORKERS = config('GRADING_WORKERS', default=4, cast=int)
+QUIZ_IMPORT_ASYNC_THRESHOLD = config('QUIZ_IMPORT_ASYNC_THRESHOLD', default=2 * 1024 * 1024, cast=int)
+
+# Профилирование запросов: число SQL-запросов, время SQL и шаблонов по каждому view
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+REQUEST_PROFILING_BUFFER = config('REQUEST_PROFILING_BUFFER', default=1000, cast=int)
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=1.0, cast=float)
+REQUEST_PROFILING_FLUSH_EVERY = config('REQUEST_PROFILING_FLUSH_EVERY', default=100, cast=int)
+REQUEST_PROFILING_DIR = config('REQUEST_PROFILING_DIR', default=str(BASE_DIR / 'profiling'))
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
@@ -1,9 +1,21 @@
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth.views import LoginView, LogoutView
-from courses import views
+from django.conf import settings
+from courses import api, async_views, views
 from courses.views import restart_quiz_for_user
 
+if settings.ASYNC_VIEWS:
+    dashboard_view = async_views.dashboard
+    take_quiz_view = async_views.take_quiz
+    api_quiz_view = async_views.api_quiz_detail
+    api_submit_view = async_views.api_submit_quiz
+else:
+    dashboard_view = views.DashboardView.as_view()
+    take_quiz_view = views.take_quiz
+    api_quiz_view = api.quiz_detail
+    api_submit_view = api.submit_quiz
+
 
 urlpatterns = [
  path('admin/', admin.site.urls),
@@ -12,9 +24,12 @@ urlpatterns = [
  path('courses/<int:pk>/', views.CourseDetailView.as_view(), name='course_detail'),
  path('courses/<int:pk>/edit/', views.EditCourseView.as_view(), name='edit_course'),
  path('courses/<int:pk>/add-module/', views.AddModuleView.as_view(), name='add_module'),
+ path('courses/<int:pk>/analytics/', views.CourseAnalyticsView.as_view(), name='course_analytics'),
+ path('courses/<int:pk>/gradebook.<str:fmt>', views.course_gradebook, name='course_gradebook'),
  path('courses/<int:pk>/enroll/', views.enroll_course, name='enroll_course'),
+ path('courses/<int:pk>/roster/', views.ImportRosterView.as_view(), name='import_roster'),
  path('module/<int:pk>/complete/', views.mark_module_complete, name='mark_module_complete'),
- path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+ path('dashboard/', dashboard_view, name='dashboard'),
  path('my-courses/', views.MyCoursesView.as_view(), name='my_courses'),
  path('create/', views.CreateCourseView.as_view(), name='create_course'),
  path('login/', LoginView.as_view(template_name='login.html'), name='login'),
@@ -23,9 +38,16 @@ urlpatterns = [
  path('course/<int:pk>/quiz/create/', views.CreateQuizView.as_view(), name='create_quiz'),
  path('quiz/<int:pk>/edit/', views.EditQuizView.as_view(), name='edit_quiz'),
  path('quiz/<int:quiz_id>/import/', views.ImportQuizQuestionsView.as_view(), name='import_questions'),
+ path('quiz/<int:pk>/analytics/', views.QuizAnalyticsView.as_view(), name='quiz_analytics'),
  path('quiz/<int:pk>/delete/', views.delete_quiz, name='delete_quiz'),
- path('quiz/<int:quiz_id>/take/', views.take_quiz, name='take_quiz'),
+ path('quiz/<int:quiz_id>/take/', take_quiz_view, name='take_quiz'),
  path('quiz/<int:quiz_id>/import-and-run/', views.auto_import_and_start_quiz, name='auto_import_and_start_quiz'),
+ path('import-jobs/<int:pk>/', views.import_job_detail, name='import_job'),
+ path('import-jobs/<int:pk>/status/', views.import_job_status, name='import_job_status'),
+ path('api/v1/quizzes/<int:quiz_id>/', api_quiz_view, name='api_quiz'),
+ path('api/v1/quizzes/<int:quiz_id>/submissions/', api_submit_view, name='api_submit_quiz'),
+ path('search/', views.search_view, name='search'),
+ path('profiling/', views.profiling_report, name='profiling_report'),
  path('quiz/<int:quiz_id>/restart/', restart_quiz_for_user, name='restart_quiz_for_user'),
 ]
 
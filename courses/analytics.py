@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, IntegerField, Sum
+from django.db.models.functions import Cast, Floor, NullIf
+from courses.models import QuestionStats, QuizResult, QuizStats
+
+
+def _histogram(values, size):
+    histogram = list(values or [])
+    return histogram + [0] * (size - len(histogram))
+
+
+def score_bucket(score):
+    return min(max(int(score), 0), QuizStats.SCORE_BUCKETS - 1)
+
+
+def match_bucket(match_score):
+    return min(max(int(match_score * QuestionStats.MATCH_BUCKETS), 0), QuestionStats.MATCH_BUCKETS - 1)
+
+
+def record_submission(quiz, graded):
+    record_submissions(quiz, [graded])
+
+
+def record_submissions(quiz, submissions):
+    # Пачка сдач одного теста обновляет агрегаты за один проход
+    with transaction.atomic():
+        QuizStats.objects.get_or_create(quiz=quiz)
+        stats = QuizStats.objects.select_for_update().get(quiz=quiz)
+        stats.score_histogram = _histogram(stats.score_histogram, QuizStats.SCORE_BUCKETS)
+        for graded in submissions:
+            stats.score_histogram[score_bucket(graded.score)] += 1
+            stats.results += 1
+            stats.score_sum += float(graded.score)
+        stats.save()
+
+        question_ids = sorted({answer.question_id for graded in submissions for answer in graded.answers})
+        QuestionStats.objects.bulk_create(
+            [QuestionStats(question_id=question_id, quiz=quiz) for question_id in question_ids],
+            ignore_conflicts=True,
+        )
+        # Блокируем строки в порядке ключей, чтобы параллельные сдачи не взаимоблокировались
+        locked = QuestionStats.objects.select_for_update().filter(question_id__in=question_ids).order_by('pk')
+        question_stats = {row.question_id: row for row in locked}
+        for row in question_stats.values():
+            row.match_histogram = _histogram(row.match_histogram, QuestionStats.MATCH_BUCKETS)
+        for graded in submissions:
+            for answer in graded.answers:
+                row = question_stats[answer.question_id]
+                row.match_histogram[match_bucket(answer.match_score)] += 1
+                row.attempts += 1
+                row.correct += int(answer.is_correct)
+        QuestionStats.objects.bulk_update(question_stats.values(), ['attempts', 'correct', 'match_histogram'])
+
+
+def compact_quiz_stats(quiz):
+    # Полный пересчёт агрегатов теста из QuizResult
+    scores = (
+        QuizResult.objects.filter(quiz=quiz)
+        .annotate(bucket=Cast(Floor('score'), IntegerField()))
+        .values('bucket')
+        .annotate(results=Count('pk'), score_sum=Sum('score'))
+        .order_by()
+    )
+    score_histogram = _histogram([], QuizStats.SCORE_BUCKETS)
+    results, score_sum = 0, 0.0
+    for row in scores:
+        score_histogram[score_bucket(row['bucket'])] += row['results']
+        results += row['results']
+        score_sum += float(row['score_sum'])
+
+    # Попытки могут быть уже в архиве или не писаться вовсе, поэтому считаем по упакованным ответам
+    question_ids = set(quiz.questions.values_list('id', flat=True))
+    question_stats = {}
+    answers = QuizResult.objects.filter(quiz=quiz).values_list('answers', flat=True)
+    for packed in answers.iterator(chunk_size=2000):
+        for question_id, _, match_score, is_correct, *_ in packed:
+            if question_id not in question_ids:
+                continue
+            stats = question_stats.setdefault(question_id, QuestionStats(
+                question_id=question_id,
+                quiz=quiz,
+                match_histogram=_histogram([], QuestionStats.MATCH_BUCKETS),
+            ))
+            stats.match_histogram[match_bucket(match_score)] += 1
+            stats.attempts += 1
+            stats.correct += int(is_correct)
+
+    with transaction.atomic():
+        QuizStats.objects.update_or_create(quiz=quiz, defaults={
+            'results': results,
+            'score_sum': score_sum,
+            'score_histogram': score_histogram,
+        })
+        QuestionStats.objects.filter(quiz=quiz).delete()
+        QuestionStats.objects.bulk_create(question_stats.values(), batch_size=1000)
+    return results, len(question_stats)
+
+
+def score_summary(stats):
+    if stats is None or not stats.results:
+        return None
+    histogram = _histogram(stats.score_histogram, QuizStats.SCORE_BUCKETS)
+    # Десять столбиков по 10 процентных пунктов, последний включает 100%
+    bars = [sum(histogram[start:start + 10]) for start in range(0, 100, 10)]
+    bars[-1] += histogram[100]
+    peak = max(bars) or 1
+    return {
+        'results': stats.results,
+        'mean': stats.mean_score,
+        'percentiles': [(p, stats.percentile(p)) for p in (25, 50, 75, 90)],
+        'bars': [(f'{start}–{start + 10}%', count, round(count * 100 / peak)) for start, count in zip(range(0, 100, 10), bars)],
+    }
+
+
+def hardest_questions(quiz):
+    rate = ExpressionWrapper(F('correct') * 1.0 / NullIf(F('attempts'), 0), output_field=FloatField())
+    rows = list(QuestionStats.objects.filter(quiz=quiz).select_related('question').order_by(rate.asc(nulls_last=True), 'pk'))
+    for row in rows:
+        histogram = _histogram(row.match_histogram, QuestionStats.MATCH_BUCKETS)
+        peak = max(histogram) or 1
+        row.bars = [round(count * 100 / peak) for count in histogram]
+    return rows
@@ -0,0 +1,171 @@
+import json
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_GET, require_POST
+from courses.cache import get_version, quiz_version_name
+from courses.grading import ANSWER_KEY_TIMEOUT, ANSWER_MAX_LENGTH, get_answer_key, grade_submission
+from courses.models import Quiz
+from courses.results import is_pending
+from courses.submissions import find_submission, store_submission
+
+API_VERSION = 'v1'
+
+
+def api_error(message, status, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def api_login_required(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not (await request.auser()).is_authenticated:
+                return api_error('Нужна авторизация', 401)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return api_error('Нужна авторизация', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def make_etag(quiz_id, version):
+    return f'{API_VERSION}-quiz-{quiz_id}-{version}'
+
+
+def quiz_etag(request, quiz_id):
+    # Версия теста лежит в кэше: на If-None-Match отвечаем 304, не трогая таблицы тестов
+    return make_etag(quiz_id, get_version(quiz_version_name(quiz_id)))
+
+
+PAYLOAD_QUIZ_FIELDS = ('id', 'title', 'description', 'course_id')
+PAYLOAD_QUESTION_FIELDS = ('id', 'text', 'description')
+
+
+def quiz_payload(quiz, questions):
+    return {
+        'id': quiz.pk,
+        'course_id': quiz.course_id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'questions': [
+            {'id': question_id, 'text': text, 'description': description}
+            for question_id, text, description in questions
+        ],
+    }
+
+
+def quiz_payload_cache_key(quiz_id):
+    return f'api-quiz:{quiz_id}:{get_version(quiz_version_name(quiz_id))}'
+
+
+def get_quiz_payload(quiz_id):
+    cache_key = quiz_payload_cache_key(quiz_id)
+    payload = cache.get(cache_key)
+    if payload is None:
+        quiz = get_object_or_404(Quiz.objects.only(*PAYLOAD_QUIZ_FIELDS), pk=quiz_id)
+        questions = quiz.questions.order_by('id').values_list(*PAYLOAD_QUESTION_FIELDS)
+        payload = quiz_payload(quiz, questions)
+        cache.set(cache_key, payload, ANSWER_KEY_TIMEOUT)
+    return payload
+
+
+def result_payload(result, graded=None):
+    # Сдача из буфера получит result_id, когда её перенесёт drain_submissions
+    pending = is_pending(result)
+    data = {
+        'result_id': None if pending else result.pk,
+        'quiz_id': result.quiz_id,
+        'score': float(result.score),
+        'number': result.number,
+        'status': 'pending' if pending else 'saved',
+    }
+    if graded is not None:
+        data.update({
+            'correct_count': graded.correct_count,
+            'total': len(graded.answers),
+            'answers': [
+                {
+                    'question_id': answer.question_id,
+                    'answer': answer.answer,
+                    'match_score': answer.match_score,
+                    'is_correct': answer.is_correct,
+                }
+                for answer in graded.answers
+            ],
+        })
+    return data
+
+
+def parse_answers(body):
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        raise ValueError('Тело запроса должно быть JSON')
+    answers = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(answers, list):
+        raise ValueError('Ожидается поле answers со списком ответов')
+    submitted = {}
+    for item in answers:
+        if not isinstance(item, dict) or not isinstance(item.get('question_id'), int):
+            raise ValueError('Каждый ответ должен содержать question_id')
+        answer = item.get('answer', '')
+        if not isinstance(answer, str):
+            raise ValueError('Ответ должен быть строкой')
+        if len(answer) > ANSWER_MAX_LENGTH:
+            raise ValueError(f'Ответ длиннее {ANSWER_MAX_LENGTH} символов')
+        submitted[item['question_id']] = answer
+    return submitted
+
+
+def read_submission(request, key):
+    try:
+        submitted = parse_answers(request.body)
+    except ValueError as exc:
+        return None, api_error(str(exc), 400)
+    # Клиент может прислать ETag полученного теста: если тест поменялся, ответы не принимаем
+    if_match = request.headers.get('If-Match')
+    if if_match and if_match.strip('"') != make_etag(key.quiz_id, key.version):
+        return None, api_error('Тест изменился, загрузите его заново', 412)
+    unknown = set(submitted) - set(key.question_ids)
+    if unknown:
+        return None, api_error('Вопросы не из этого теста', 400, question_ids=sorted(unknown))
+    return submitted, None
+
+
+@api_login_required
+@require_GET
+@condition(etag_func=quiz_etag)
+def quiz_detail(request, quiz_id):
+    response = JsonResponse(get_quiz_payload(quiz_id))
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_login_required
+@require_POST
+def submit_quiz(request, quiz_id):
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    existing = find_submission(quiz, request.user)
+    if existing:
+        return api_error('Тест уже пройден', 409, result=result_payload(existing))
+
+    key = get_answer_key(quiz)
+    submitted, error = read_submission(request, key)
+    if error:
+        return error
+
+    graded = grade_submission(key, submitted)
+    try:
+        result = store_submission(quiz, request.user, graded)
+    except IntegrityError:
+        result = find_submission(quiz, request.user)
+        return api_error('Тест уже пройден', 409, result=result_payload(result))
+    return JsonResponse(result_payload(result, graded), status=201)
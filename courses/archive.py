@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from courses.models import QuizAttempt, QuizAttemptArchive, QuizResult
+
+ARCHIVE_BATCH_SIZE = 2000
+ATTEMPT_FIELDS = (
+    'pk', 'user_id', 'question_id', 'answer', 'match_score', 'is_correct', 'correct_answer_id', 'correct_text',
+    'created_at',
+)
+
+
+def hot_window_start(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def month_start(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def archive_attempts(before, batch_size=ARCHIVE_BATCH_SIZE):
+    # Разбор результата читается из упакованных ответов, поэтому строки попыток
+    # можно увозить в архив без потери истории
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                QuizAttempt.objects.filter(created_at__lt=before)
+                .order_by('pk').values_list(*ATTEMPT_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return total
+            attempt_ids = [row[0] for row in rows]
+            results = dict(
+                QuizResult.attempts.through.objects.filter(quizattempt_id__in=attempt_ids)
+                .values_list('quizattempt_id', 'quizresult_id')
+            )
+            QuizAttemptArchive.objects.bulk_create([
+                QuizAttemptArchive(
+                    result_id=results.get(pk), user_id=user_id, question_id=question_id, answer=answer,
+                    match_score=match_score, is_correct=is_correct, correct_answer_id=correct_answer_id,
+                    correct_text=correct_text, created_at=created_at, month=month_start(created_at),
+                )
+                for (
+                    pk, user_id, question_id, answer, match_score, is_correct, correct_answer_id, correct_text,
+                    created_at,
+                ) in rows
+            ])
+            # Связи с результатами удаляются вместе с попытками
+            QuizAttempt.objects.filter(pk__in=attempt_ids).delete()
+        total += len(rows)
+
+
+def drop_archived_months(before_month):
+    deleted, _ = QuizAttemptArchive.objects.filter(month__lt=before_month).delete()
+    return deleted
@@ -0,0 +1,119 @@
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.views.decorators.http import condition, require_GET, require_POST
+from courses.api import (
+    PAYLOAD_QUESTION_FIELDS, PAYLOAD_QUIZ_FIELDS, api_error, api_login_required, quiz_etag, quiz_payload,
+    quiz_payload_cache_key, read_submission, result_payload,
+)
+from courses.cache import get_version, quiz_version_name
+from courses.grading import ANSWER_KEY_TIMEOUT, ANSWER_MAX_LENGTH, agrade_submission, answers_too_long, get_answer_key
+from courses.models import Quiz
+from courses.progress import enrollments_with_progress
+from courses.routers import replica_reads
+from courses.readmodels import quiz_form_questions
+from courses.results import aselect_session, is_pending
+from courses.submissions import afind_submission, store_submission
+from courses.views import session_number, taken_context
+
+# Ключ ответов и сохранение результата работают в транзакциях и с кэшем,
+# async ORM транзакций не умеет, поэтому они идут через sync_to_async
+aget_answer_key = sync_to_async(get_answer_key)
+astore_submission = sync_to_async(store_submission)
+
+
+async def current_user(request):
+    # Шаблоны обращаются к request.user: подставляем уже загруженного пользователя,
+    # иначе ленивый объект полезет в БД синхронно
+    request.user = await request.auser()
+    return request.user
+
+
+async def with_answer_rows(result):
+    # Разбор ответов подгружает вопросы, в async-view делаем это до рендера шаблона
+    if result is not None and not is_pending(result):
+        await sync_to_async(lambda: result.answer_rows)()
+    return result
+
+
+@replica_reads
+@login_required
+async def dashboard(request):
+    user = await current_user(request)
+    enrollments = [enrollment async for enrollment in enrollments_with_progress(user)]
+    return render(request, 'dashboard.html', {'enrollments': enrollments})
+
+
+@login_required
+async def take_quiz(request, quiz_id):
+    user = await current_user(request)
+    quiz = await aget_object_or_404(Quiz, id=quiz_id)
+
+    existing_result = await afind_submission(quiz, user)
+    if existing_result:
+        result = await with_answer_rows(await aselect_session(existing_result, session_number(request)))
+        return render(request, 'take_quiz.html', taken_context(quiz, result))
+
+    if request.method == 'POST':
+        key = await aget_answer_key(quiz)
+        submitted = {question_id: request.POST.get(f'q{question_id}', '') for question_id in key.question_ids}
+        if answers_too_long(submitted):
+            messages.error(request, f"Ответ длиннее {ANSWER_MAX_LENGTH} символов")
+            return redirect('take_quiz', quiz_id=quiz.pk)
+        graded = await agrade_submission(key, submitted)
+        try:
+            result = await astore_submission(quiz, user, graded)
+        except IntegrityError:
+            # Повторная отправка формы: результат уже сохранён параллельным запросом
+            result = await afind_submission(quiz, user)
+            if result is None:
+                raise Http404
+        result = await with_answer_rows(result)
+        return render(request, 'take_quiz.html', taken_context(quiz, result))
+
+    questions = [question async for question in quiz_form_questions(quiz)]
+    quiz_version = await sync_to_async(get_version)(quiz_version_name(quiz.pk))
+    return render(request, 'take_quiz.html', {'quiz': quiz, 'questions': questions, 'quiz_version': quiz_version})
+
+
+@api_login_required
+@require_GET
+@condition(etag_func=quiz_etag)
+async def api_quiz_detail(request, quiz_id):
+    cache_key = quiz_payload_cache_key(quiz_id)
+    payload = await cache.aget(cache_key)
+    if payload is None:
+        quiz = await aget_object_or_404(Quiz.objects.only(*PAYLOAD_QUIZ_FIELDS), pk=quiz_id)
+        questions = [row async for row in quiz.questions.order_by('id').values_list(*PAYLOAD_QUESTION_FIELDS)]
+        payload = quiz_payload(quiz, questions)
+        await cache.aset(cache_key, payload, ANSWER_KEY_TIMEOUT)
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_login_required
+@require_POST
+async def api_submit_quiz(request, quiz_id):
+    user = await request.auser()
+    quiz = await aget_object_or_404(Quiz, pk=quiz_id)
+    existing = await afind_submission(quiz, user)
+    if existing:
+        return api_error('Тест уже пройден', 409, result=result_payload(existing))
+
+    key = await aget_answer_key(quiz)
+    submitted, error = read_submission(request, key)
+    if error:
+        return error
+
+    graded = await agrade_submission(key, submitted)
+    try:
+        result = await astore_submission(quiz, user, graded)
+    except IntegrityError:
+        result = await afind_submission(quiz, user)
+        return api_error('Тест уже пройден', 409, result=result_payload(result))
+    return JsonResponse(result_payload(result, graded), status=201)
@@ -0,0 +1,290 @@
+import csv
+import io
+import statistics
+import time
+from dataclasses import dataclass
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import connection, models, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from courses.grading import save_submission
+from courses.models import Answer, Course, Quiz, QuizAttempt, QuizResult
+from courses.results import open_retake
+from courses.submissions import DRAIN_BATCH_SIZE, buffer_submission, drain_submissions
+from courses.utils import percentile
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+    }
+
+
+def latency_summary(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3) if timings else 0,
+    }
+
+
+def hot_queries(quiz, student, owner):
+    return {
+        'quiz_result_lookup': QuizResult.objects.filter(quiz=quiz, student=student),
+        'attempts_by_user_and_quiz': QuizAttempt.objects.filter(user=student, question__quiz=quiz),
+        'correct_answers_of_quiz': Answer.objects.filter(question__quiz=quiz, is_correct=True),
+        'courses_of_owner': Course.objects.filter(owner=owner).order_by('-created_at'),
+    }
+
+
+def query_pattern_indexes():
+    return [
+        (Answer, index) for index in Answer._meta.indexes
+    ] + [
+        (QuizAttempt, index) for index in QuizAttempt._meta.indexes
+    ] + [
+        (Course, index) for index in Course._meta.indexes
+    ] + [
+        (QuizResult, constraint) for constraint in QuizResult._meta.constraints
+    ]
+
+
+def set_query_pattern_indexes(enabled):
+    # На SQLite перед внешней транзакцией нужно вызвать
+    # connection.disable_constraint_checking(), иначе schema_editor не откроется
+    with connection.schema_editor(atomic=False) as editor:
+        for model, index in query_pattern_indexes():
+            if isinstance(index, models.Index):
+                (editor.add_index if enabled else editor.remove_index)(model, index)
+            else:
+                (editor.add_constraint if enabled else editor.remove_constraint)(model, index)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def measure_hot_queries(quiz, student, owner, repeat=50):
+    report = {}
+    for name, queryset in hot_queries(quiz, student, owner).items():
+        report[name] = {
+            'plan': queryset.explain(),
+            **timed(lambda: list(queryset.all()), repeat),
+        }
+    return report
+
+
+@dataclass
+class ViewScenario:
+    name: str
+    url: str
+    user: object = None
+    method: str = 'get'
+    data: object = None
+    # Изменения POST-запросов откатываются, чтобы каждый повтор шёл по одним данным
+    rollback: bool = False
+
+    def payload(self):
+        return self.data() if callable(self.data) else self.data
+
+    def request(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, self.method)(self.url, self.payload() or {})
+            elapsed = (time.perf_counter() - started) * 1000
+        return response, elapsed, len(ctx.captured_queries)
+
+    def run(self, repeat, warmup=0):
+        client = Client()
+        if self.user is not None:
+            client.force_login(self.user)
+        timings = []
+        queries = []
+        statuses = set()
+        for i in range(warmup + repeat):
+            with transaction.atomic():
+                response, elapsed, count = self.request(client)
+                if self.rollback:
+                    transaction.set_rollback(True)
+            if i >= warmup:
+                timings.append(elapsed)
+                queries.append(count)
+                statuses.add(response.status_code)
+        return {
+            'method': self.method.upper(),
+            'url': self.url,
+            'requests': repeat,
+            'statuses': sorted(statuses),
+            **latency_summary(timings),
+            'queries_min': min(queries, default=0),
+            'queries_max': max(queries, default=0),
+        }
+
+
+def quiz_csv(quiz, extra=10):
+    # Повторный импорт текущих вопросов теста и несколько новых
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['question', 'answer', 'is_correct'])
+    # Все текущие ответы с их правильностью: совпавшая часть импортируется без изменений.
+    # iter_quiz_rows считает правильным только 'true'
+    answers = Answer.objects.filter(question__quiz=quiz).order_by('question_id', 'id')
+    for question, answer, is_correct in answers.values_list('question__text', 'text', 'is_correct'):
+        writer.writerow([question, answer, 'true' if is_correct else 'false'])
+    writer.writerows([f'Новый вопрос {i}?', f'Ответ {i}', 'true'] for i in range(extra))
+    return output.getvalue().encode('utf-8')
+
+
+def view_scenarios(student, owner, quiz):
+    csv_content = quiz_csv(quiz)
+    questions = list(quiz.questions.values_list('id', flat=True))
+    return [
+        ViewScenario('course_list', reverse('course_list'), user=student),
+        ViewScenario('dashboard', reverse('dashboard'), user=student),
+        ViewScenario('take_quiz_get', reverse('take_quiz', args=[quiz.pk]), user=student),
+        ViewScenario(
+            'take_quiz_post', reverse('take_quiz', args=[quiz.pk]), user=student, method='post',
+            data={f'q{question_id}': f'Ответ {question_id}' for question_id in questions}, rollback=True,
+        ),
+        ViewScenario('edit_quiz', reverse('edit_quiz', args=[quiz.pk]), user=owner),
+        ViewScenario(
+            'import_questions', reverse('import_questions', args=[quiz.pk]), user=owner, method='post',
+            data=lambda: {
+                'file': SimpleUploadedFile('questions.csv', csv_content, content_type='text/csv'),
+                'incremental': 'on',
+            },
+            rollback=True,
+        ),
+    ]
+
+
+def measure_views(scenarios, repeat=30, warmup=3):
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        return {scenario.name: scenario.run(repeat, warmup=warmup) for scenario in scenarios}
+
+
+def pick_subjects(prefix):
+    student = (
+        User.objects.filter(username__startswith=f'{prefix}_user_', enrollments__isnull=False)
+        .order_by('pk').first()
+    )
+    if student is None:
+        raise CommandError(f'Нет данных с префиксом "{prefix}": запустите generate_dataset или укажите --generate')
+    quiz = (
+        Quiz.objects.filter(course__enrollments__student=student).select_related('course__owner')
+        .order_by('pk').first()
+    )
+    if quiz is None:
+        raise CommandError('У студентов набора нет доступных тестов')
+    # Для замера прохождения теста студент начинает тест заново
+    open_retake(quiz, student)
+    return student, quiz.course.owner, quiz
+
+
+def render_scenarios(student, owner, quiz):
+    return [
+        ViewScenario('course_list', reverse('course_list'), user=student),
+        ViewScenario('course_detail', reverse('course_detail', args=[quiz.course_id]), user=owner),
+        ViewScenario('take_quiz_get', reverse('take_quiz', args=[quiz.pk]), user=student),
+    ]
+
+
+def template_profile(cached_loader, fragments):
+    template_settings = settings.TEMPLATES[0]
+    loaders = settings.TEMPLATE_LOADERS
+    return override_settings(
+        TEMPLATES=[{
+            **template_settings,
+            'OPTIONS': {
+                **template_settings['OPTIONS'],
+                'loaders': [('django.template.loaders.cached.Loader', loaders)] if cached_loader else loaders,
+            },
+        }],
+        CACHES={
+            **settings.CACHES,
+            'template_fragments': (
+                settings.CACHES['template_fragments'] if fragments
+                else {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+            ),
+        },
+    )
+
+
+RENDER_PROFILES = {
+    'baseline': (False, False),
+    'cached_loader': (True, False),
+    'fragments': (True, True),
+}
+
+
+def measure_renders(scenarios, repeat=30, warmup=3):
+    # Те же страницы без кэшей, с кэшированным загрузчиком и с фрагментами; прогрев заполняет кэш фрагментов
+    report = {}
+    for name, (cached_loader, fragments) in RENDER_PROFILES.items():
+        with template_profile(cached_loader, fragments):
+            report[name] = measure_views(scenarios, repeat, warmup)
+    for name, data in report['fragments'].items():
+        baseline = report['baseline'][name]['p50_ms']
+        data['p50_reduction_pct'] = round((1 - data['p50_ms'] / baseline) * 100, 1) if baseline else 0
+    return report
+
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    # execute_wrapper вместо CaptureQueriesContext: тот хранит только последние 9000 запросов
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+def _replay(submissions, store):
+    counter = WriteCounter()
+    timings = []
+    with connection.execute_wrapper(counter):
+        for quiz, student, graded in submissions:
+            started = time.perf_counter()
+            store(quiz, student, graded)
+            timings.append((time.perf_counter() - started) * 1000)
+    return counter.writes, timings
+
+
+def measure_submission_writes(submissions, batch_size=DRAIN_BATCH_SIZE):
+    # Одни и те же сдачи пишутся сразу в результаты и через буфер; каждый прогон откатывается
+    report = {}
+    with transaction.atomic():
+        writes, timings = _replay(submissions, save_submission)
+        report['direct'] = {'request_writes': writes, 'drain_writes': 0, 'writes': writes, **latency_summary(timings)}
+        transaction.set_rollback(True)
+
+    with transaction.atomic():
+        writes, timings = _replay(submissions, buffer_submission)
+        counter = WriteCounter()
+        with connection.execute_wrapper(counter):
+            while drain_submissions(batch_size):
+                pass
+        drain_writes = counter.writes
+        report['buffered'] = {
+            'request_writes': writes, 'drain_writes': drain_writes, 'writes': writes + drain_writes,
+            **latency_summary(timings),
+        }
+        transaction.set_rollback(True)
+
+    for data in report.values():
+        data['writes_per_submission'] = round(data['writes'] / len(submissions), 3) if submissions else 0
+    return report
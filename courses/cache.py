@@ -0,0 +1,49 @@
+import time
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # Стартуем со времени, чтобы после вытеснения ключа не вернуться к старой версии
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names):
+    versions = cache.get_many([_version_key(name) for name in names])
+    return {name: versions.get(_version_key(name)) or get_version(name) for name in names}
+
+
+def fragment_cached(fragment_name, *vary_on):
+    return caches['template_fragments'].get(make_template_fragment_key(fragment_name, vary_on)) is not None
+
+
+def bump_version(name):
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(name)
+        return cache.incr(key)
+
+
+def quiz_version_name(quiz_id):
+    return f'quiz:{quiz_id}'
+
+
+def course_version_name(course_id):
+    return f'course:{course_id}'
+
+
+def invalidate_course(course_id):
+    # Страница курса и его карточка в каталоге кэшируются фрагментами с этой версией
+    transaction.on_commit(lambda: bump_version(course_version_name(course_id)))
@@ -0,0 +1,74 @@
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from courses.cache import bump_version, get_version
+from courses.models import Course, Enrollment
+from courses.routers import read_from_primary
+
+CATALOGUE_PAGE_SIZE = 20
+CATALOGUE_TIMEOUT = 60 * 10
+CATALOGUE_VERSION = 'catalogue'
+
+
+@dataclass
+class CataloguePage:
+    courses: list
+    cursor: str = None
+    next_cursor: str = None
+    version: int = None
+
+
+def encode_cursor(course):
+    raw = f'{course.created_at.isoformat()}|{course.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def build_catalogue_page(cursor=None, page_size=CATALOGUE_PAGE_SIZE):
+    # Keyset-пагинация по (created_at, id): страница не зависит от OFFSET
+    courses = Course.objects.only('id', 'title', 'description', 'created_at', 'enrollment_count').order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        courses = courses.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(courses[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return CataloguePage(courses=rows[:page_size], cursor=cursor, next_cursor=next_cursor)
+
+
+def get_catalogue_page(cursor=None, page_size=CATALOGUE_PAGE_SIZE):
+    # Битый курсор считаем первой страницей, чтобы не плодить ключи кэша
+    if cursor and decode_cursor(cursor) is None:
+        cursor = None
+    version = get_version(CATALOGUE_VERSION)
+    cache_key = f'catalogue:{version}:{page_size}:{cursor or "first"}'
+    page = cache.get(cache_key)
+    if page is None:
+        read_from_primary()
+        page = build_catalogue_page(cursor, page_size)
+        page.version = version
+        cache.set(cache_key, page, CATALOGUE_TIMEOUT)
+    return page
+
+
+def enrolled_course_ids(user, courses):
+    if not user.is_authenticated or not courses:
+        return set()
+    return set(
+        Enrollment.objects.filter(student=user, course_id__in=[course.pk for course in courses])
+        .values_list('course_id', flat=True)
+    )
+
+
+def invalidate_catalogue():
+    transaction.on_commit(lambda: bump_version(CATALOGUE_VERSION))
@@ -0,0 +1,36 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from courses.models import Course, Enrollment, Module, Question, Quiz
+
+# Счётчик -> (модель, чьи строки считаются, поле связи)
+COUNTERS = {
+    (Course, 'module_count'): (Module, 'course'),
+    (Course, 'quiz_count'): (Quiz, 'course'),
+    (Course, 'enrollment_count'): (Enrollment, 'course'),
+    (Quiz, 'question_count'): (Question, 'quiz'),
+}
+
+
+def add_to_counter(model, pk, field, delta):
+    # Инкремент на стороне БД: параллельные записи не теряют друг друга.
+    # Уже разошедшийся счётчик не уходит ниже нуля, его поправит reconcile_counters
+    if delta:
+        value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        model.objects.filter(pk=pk).update(**{field: value})
+
+
+def counted(related, key):
+    rows = related.objects.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(total=Count('pk'))
+    return Coalesce(Subquery(rows.values('total'), output_field=IntegerField()), 0)
+
+
+def reconcile_counters(dry_run=False):
+    # Пересчёт из исходных таблиц там, где счётчик разошёлся (правки через админку, bulk-операции)
+    drift = {}
+    for (model, field), (related, key) in COUNTERS.items():
+        drifted = model.objects.annotate(actual=counted(related, key)).exclude(**{field: F('actual')})
+        name = f'{model.__name__}.{field}'
+        drift[name] = drifted.count()
+        if drift[name] and not dry_run:
+            model.objects.filter(pk__in=drifted.values('pk')).update(**{field: counted(related, key)})
+    return drift
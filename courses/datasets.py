@@ -0,0 +1,204 @@
+import random
+from dataclasses import asdict, dataclass
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from courses.counters import reconcile_counters
+from courses.models import (
+    Answer, Course, CourseProgress, Enrollment, Module, Progress, Question, Quiz, QuizAttempt, QuizResult,
+    QuizScoreSummary,
+)
+
+DEFAULT_PASSWORD = 'bench-password'
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 50
+    courses: int = 10
+    modules_per_course: int = 10
+    quizzes_per_course: int = 2
+    questions_per_quiz: int = 20
+    answers_per_question: int = 3
+    enrollments_per_user: int = 5
+    results_per_user: int = 2
+    completion_rate: float = 0.5
+    seed: int = 42
+    prefix: str = 'bench'
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class DatasetGenerator:
+    def __init__(self, spec, batch_size=2000):
+        self.spec = spec
+        self.batch_size = batch_size
+        self.random = random.Random(spec.seed)
+        self.counts = {}
+
+    def create(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(created)
+        return created
+
+    def run(self):
+        with transaction.atomic():
+            users = self.create_users()
+            courses = self.create_courses(users)
+            modules = self.create_modules(courses)
+            quizzes = self.create_quizzes(courses)
+            questions = self.create_questions(quizzes)
+            correct = self.create_answers(questions)
+            enrollments = self.create_enrollments(users, courses)
+            self.create_progress(enrollments, modules)
+            self.create_results(enrollments, quizzes, questions, correct)
+            # bulk_create счётчики не трогает
+            reconcile_counters()
+        return self.counts
+
+    def create_users(self):
+        password = make_password(DEFAULT_PASSWORD)
+        return self.create(User, [
+            User(username=f'{self.spec.prefix}_user_{i}', email=f'{self.spec.prefix}_user_{i}@example.com', password=password)
+            for i in range(self.spec.users)
+        ])
+
+    def create_courses(self, users):
+        # Курсы создаёт примерно каждый пятый пользователь
+        owners = users[:max(1, len(users) // 5)]
+        return self.create(Course, [
+            Course(
+                title=f'Курс {i}',
+                description=' '.join(f'слово{self.random.randrange(500)}' for _ in range(40)),
+                owner=self.random.choice(owners),
+            )
+            for i in range(self.spec.courses)
+        ])
+
+    def create_modules(self, courses):
+        modules = self.create(Module, [
+            Module(course=course, title=f'Модуль {i}', description=f'Описание модуля {i}')
+            for course in courses
+            for i in range(self.spec.modules_per_course)
+        ])
+        by_course = {}
+        for module in modules:
+            by_course.setdefault(module.course_id, []).append(module)
+        return by_course
+
+    def create_quizzes(self, courses):
+        quizzes = self.create(Quiz, [
+            Quiz(course=course, title=f'Тест {i} курса {course.pk}')
+            for course in courses
+            for i in range(self.spec.quizzes_per_course)
+        ])
+        by_course = {}
+        for quiz in quizzes:
+            by_course.setdefault(quiz.course_id, []).append(quiz)
+        return by_course
+
+    def create_questions(self, quizzes):
+        questions = self.create(Question, [
+            Question(quiz=quiz, text=f'Вопрос {i} теста {quiz.pk}?')
+            for course_quizzes in quizzes.values()
+            for quiz in course_quizzes
+            for i in range(self.spec.questions_per_quiz)
+        ])
+        by_quiz = {}
+        for question in questions:
+            by_quiz.setdefault(question.quiz_id, []).append(question)
+        return by_quiz
+
+    def create_answers(self, questions):
+        answers = []
+        correct = {}
+        for quiz_questions in questions.values():
+            for question in quiz_questions:
+                correct[question.pk] = f'Ответ {question.pk}'
+                answers.append(Answer(question=question, text=correct[question.pk], is_correct=True))
+                answers.extend(
+                    Answer(question=question, text=f'Неверный ответ {question.pk}-{i}')
+                    for i in range(1, self.spec.answers_per_question)
+                )
+        self.create(Answer, answers)
+        return correct
+
+    def create_enrollments(self, users, courses):
+        per_user = min(self.spec.enrollments_per_user, len(courses))
+        enrollments = self.create(Enrollment, [
+            Enrollment(student=user, course=course)
+            for user in users
+            for course in self.random.sample(courses, per_user)
+        ])
+        CourseStudent = Course.students.through
+        self.create(CourseStudent, [
+            CourseStudent(course_id=enrollment.course_id, user_id=enrollment.student_id) for enrollment in enrollments
+        ])
+        return enrollments
+
+    def create_progress(self, enrollments, modules):
+        progress = []
+        rollups = []
+        for enrollment in enrollments:
+            completed = [
+                module for module in modules.get(enrollment.course_id, [])
+                if self.random.random() < self.spec.completion_rate
+            ]
+            progress.extend(Progress(student_id=enrollment.student_id, module=module) for module in completed)
+            if completed:
+                rollups.append(CourseProgress(
+                    student_id=enrollment.student_id,
+                    course_id=enrollment.course_id,
+                    completed_modules=len(completed),
+                ))
+        self.create(Progress, progress)
+        self.create(CourseProgress, rollups)
+
+    def create_results(self, enrollments, quizzes, questions, correct):
+        by_student = {}
+        for enrollment in enrollments:
+            by_student.setdefault(enrollment.student_id, []).extend(quizzes.get(enrollment.course_id, []))
+
+        results = []
+        attempts = []
+        for student_id, available in by_student.items():
+            for quiz in self.random.sample(available, min(self.spec.results_per_user, len(available))):
+                graded = []
+                for question in questions.get(quiz.pk, []):
+                    is_correct = self.random.random() < 0.6
+                    graded.append(QuizAttempt(
+                        user_id=student_id,
+                        question=question,
+                        answer=correct[question.pk] if is_correct else 'не знаю',
+                        match_score=1.0 if is_correct else round(self.random.random() * 0.8, 2),
+                        is_correct=is_correct,
+                    ))
+                score = round(sum(a.is_correct for a in graded) / len(graded) * 100, 2) if graded else 0
+                packed = [[a.question_id, a.answer, a.match_score, a.is_correct] for a in graded]
+                results.append(QuizResult(quiz=quiz, student_id=student_id, score=score, answers=packed))
+                attempts.append(graded)
+
+        results = self.create(QuizResult, results)
+        created = self.create(QuizAttempt, [attempt for group in attempts for attempt in group])
+        Link = QuizResult.attempts.through
+        links = []
+        position = 0
+        for result, group in zip(results, attempts):
+            links.extend(
+                Link(quizresult_id=result.pk, quizattempt_id=attempt.pk)
+                for attempt in created[position:position + len(group)]
+            )
+            position += len(group)
+        self.create(Link, links)
+        self.create(QuizScoreSummary, [
+            QuizScoreSummary(
+                quiz_id=result.quiz_id, student_id=result.student_id, attempts=1, best_score=result.score,
+                best_number=1, last_score=result.score, last_result=result,
+            )
+            for result in results
+        ])
+
+
+def generate_dataset(spec, batch_size=2000):
+    return DatasetGenerator(spec, batch_size=batch_size).run()
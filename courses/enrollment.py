@@ -0,0 +1,110 @@
+import time
+from dataclasses import asdict, dataclass, field
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from courses.counters import add_to_counter
+from courses.models import Course, Enrollment
+from courses.utils import iter_roster_rows
+
+ROSTER_BATCH_SIZE = 1000
+UNKNOWN_SAMPLE_SIZE = 20
+
+
+@dataclass
+class RosterReport:
+    rows_read: int = 0
+    duplicates: int = 0
+    created: int = 0
+    existing: int = 0
+    unknown: int = 0
+    unknown_sample: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+    def summary(self):
+        return (
+            f"записано: {self.created}, уже на курсе: {self.existing}, "
+            f"не найдено: {self.unknown}, дубликатов: {self.duplicates}"
+        )
+
+
+def enroll_students(course, user_ids):
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        # Строка курса блокируется: параллельные записи на курс не задваивают счётчик студентов,
+        # а ignore_conflicts страхует от дублей в обход этой функции
+        Course.objects.select_for_update().only('pk').get(pk=course.pk)
+        existing = set(
+            Enrollment.objects.filter(course=course, student_id__in=user_ids).values_list('student_id', flat=True)
+        )
+        new = sorted(user_ids - existing)
+        Enrollment.objects.bulk_create(
+            [Enrollment(course=course, student_id=user_id) for user_id in new], ignore_conflicts=True,
+        )
+        CourseStudent = Course.students.through
+        CourseStudent.objects.bulk_create(
+            [CourseStudent(course_id=course.pk, user_id=user_id) for user_id in new], ignore_conflicts=True,
+        )
+        add_to_counter(Course, course.pk, 'enrollment_count', len(new))
+    return len(new), len(existing)
+
+
+def roster_key(identifier):
+    return identifier.lower() if '@' in identifier else identifier
+
+
+def resolve_users(keys):
+    emails = {key for key in keys if '@' in key}
+    usernames = set(keys) - emails
+    found = {}
+    rows = (
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(Q(username__in=usernames) | Q(email_lower__in=emails))
+        .order_by('pk').values_list('pk', 'username', 'email_lower')
+    )
+    for pk, username, email in rows:
+        if username in usernames:
+            found.setdefault(username, pk)
+        if email in emails:
+            found.setdefault(email, pk)
+    return found
+
+
+def _enroll_batch(course, keys, report):
+    if not keys:
+        return
+    found = resolve_users(keys)
+    for key in keys:
+        if key not in found:
+            report.unknown += 1
+            if len(report.unknown_sample) < UNKNOWN_SAMPLE_SIZE:
+                report.unknown_sample.append(key)
+    created, existing = enroll_students(course, found.values())
+    report.created += created
+    report.existing += existing
+
+
+def import_roster(course, file_obj, batch_size=ROSTER_BATCH_SIZE):
+    # Файл читается потоком, пользователи ищутся и записываются пачками по batch_size
+    started = time.monotonic()
+    report = RosterReport()
+    seen = set()
+    batch = []
+    for identifier in iter_roster_rows(file_obj):
+        report.rows_read += 1
+        key = roster_key(identifier)
+        if key in seen:
+            report.duplicates += 1
+            continue
+        seen.add(key)
+        batch.append(key)
+        if len(batch) >= batch_size:
+            _enroll_batch(course, batch, report)
+            batch = []
+    _enroll_batch(course, batch, report)
+    report.elapsed = round(time.monotonic() - started, 3)
+    return report
@@ -3,6 +3,14 @@ from courses.models import Quiz
 
 class UploadFileForm(forms.Form):
     file = forms.FileField(label="Файл")
+    incremental = forms.BooleanField(
+        label="Обновить только изменения (сохранить историю попыток)",
+        required=False,
+        initial=True,
+    )
+
+class RosterUploadForm(forms.Form):
+    file = forms.FileField(label="CSV со списком студентов (логин или email в первой колонке)")
 
 class QuizForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,137 @@
+import csv
+import zipfile
+from itertools import chain
+from xml.sax.saxutils import escape
+from courses.models import Enrollment, QuizScoreSummary
+
+GRADEBOOK_CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Журнал" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+SHEET_START = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = b'</sheetData></worksheet>'
+
+
+def gradebook_header(quizzes):
+    return ['Студент', 'Email', *(title for _, title in quizzes)]
+
+
+def gradebook_rows(course, quizzes, chunk_size=GRADEBOOK_CHUNK_SIZE):
+    # Студенты и сводки читаются двумя курсорами в порядке student_id и сливаются за один проход,
+    # в памяти только строка текущего студента
+    position = {quiz_id: index for index, (quiz_id, _) in enumerate(quizzes)}
+    students = (
+        Enrollment.objects.filter(course=course).order_by('student_id')
+        .values_list('student_id', 'student__username', 'student__email')
+        .iterator(chunk_size=chunk_size)
+    )
+    scores = (
+        QuizScoreSummary.objects.filter(quiz__course=course, best_score__isnull=False).order_by('student_id')
+        .values_list('student_id', 'quiz_id', 'best_score')
+        .iterator(chunk_size=chunk_size)
+    )
+    score = next(scores, None)
+    for student_id, username, email in students:
+        row = [''] * len(quizzes)
+        while score is not None and score[0] <= student_id:
+            if score[0] == student_id:
+                row[position[score[1]]] = score[2]
+            score = next(scores, None)
+        yield [username, email, *row]
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл кириллицу без мастера импорта
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class ZipStream:
+    # zipfile умеет писать в поток без seek, накопленные байты отдаём кусками
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value):
+    if value == '' or value is None:
+        return '<c/>'
+    if isinstance(value, str):
+        return f'<c t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+    return f'<c><v>{value}</v></c>'
+
+
+def _xlsx_row(number, row):
+    return f'<row r="{number}">{"".join(_xlsx_cell(value) for value in row)}</row>'.encode()
+
+
+def stream_xlsx(header, rows):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_START)
+            for number, row in enumerate(chain([header], rows), 1):
+                sheet.write(_xlsx_row(number, row))
+                data = stream.drain()
+                if data:
+                    yield data
+            sheet.write(SHEET_END)
+    yield stream.drain()
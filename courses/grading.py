@@ -0,0 +1,192 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+from courses.analytics import record_submission
+from courses.cache import bump_version, get_version, quiz_version_name
+from courses.models import Answer, QuizAttempt, QuizResult
+from courses.results import next_attempt_number, record_scores
+from courses.utils import normalize_answer
+
+PASS_THRESHOLD = 0.85
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+ANSWER_MAX_LENGTH = QuizAttempt._meta.get_field('answer').max_length
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    quiz_id: int
+    question_ids: tuple
+    references: dict = field(default_factory=dict)
+    version: int = None
+    # (answer_id, исходный текст) для каждого эталона, в том же порядке, что references
+    answers: dict = field(default_factory=dict)
+
+    def has_correct(self, question_id):
+        return bool(self.references.get(question_id))
+
+
+@dataclass
+class GradedAnswer:
+    question_id: int
+    answer: str
+    match_score: float
+    is_correct: bool
+    correct_answer_id: int = None
+    correct_text: str = ''
+
+
+@dataclass
+class GradedSubmission:
+    answers: list
+
+    @property
+    def correct_count(self):
+        return sum(1 for answer in self.answers if answer.is_correct)
+
+    @property
+    def score(self):
+        if not self.answers:
+            return 0
+        return round((self.correct_count / len(self.answers)) * 100, 2)
+
+
+def answers_too_long(submitted):
+    return any(len(answer) > ANSWER_MAX_LENGTH for answer in submitted.values())
+
+
+def build_answer_key(quiz, version=None):
+    question_ids = tuple(quiz.questions.order_by('id').values_list('id', flat=True))
+    references = {}
+    answers = {}
+    correct = (
+        Answer.objects.filter(question__quiz=quiz, is_correct=True)
+        .order_by('pk').values_list('question_id', 'pk', 'text')
+    )
+    for question_id, answer_id, text in correct:
+        normalized = normalize_answer(text)
+        if normalized not in references.setdefault(question_id, ()):
+            references[question_id] += (normalized,)
+            answers[question_id] = answers.get(question_id, ()) + ((answer_id, text),)
+    return AnswerKey(
+        quiz_id=quiz.pk, question_ids=question_ids, references=references, version=version, answers=answers,
+    )
+
+
+def get_answer_key(quiz):
+    version = get_version(quiz_version_name(quiz.pk))
+    # v2: в ключе появились исходные тексты правильных ответов
+    cache_key = f'answer-key:v2:{quiz.pk}:{version}'
+    key = cache.get(cache_key)
+    if key is None:
+        key = build_answer_key(quiz, version=version)
+        cache.set(cache_key, key, ANSWER_KEY_TIMEOUT)
+    return key
+
+
+def invalidate_answer_key(quiz_id):
+    transaction.on_commit(lambda: bump_version(quiz_version_name(quiz_id)))
+
+
+def grade_submission(key, submitted):
+    graded = []
+    for question_id in key.question_ids:
+        answer = (submitted.get(question_id) or '').strip()
+        references = key.references.get(question_id, ())
+        match_score = 0.0
+        correct_answer_id, correct_text = None, ''
+        if references:
+            # Эталоны уже нормализованы, поэтому processor=None
+            _, best, index = process.extractOne(
+                normalize_answer(answer), references, scorer=fuzz.token_set_ratio, processor=None
+            )
+            match_score = best / 100.0
+            # Запоминаем ближайший правильный ответ: его и покажет разбор
+            correct_answer_id, correct_text = key.answers[question_id][index]
+        graded.append(GradedAnswer(
+            question_id=question_id,
+            answer=answer,
+            match_score=match_score,
+            is_correct=match_score >= PASS_THRESHOLD,
+            correct_answer_id=correct_answer_id,
+            correct_text=correct_text,
+        ))
+    return GradedSubmission(answers=graded)
+
+
+_grading_executor = None
+
+
+def grading_executor():
+    global _grading_executor
+    if _grading_executor is None:
+        _grading_executor = ThreadPoolExecutor(max_workers=settings.GRADING_WORKERS, thread_name_prefix='grading')
+    return _grading_executor
+
+
+async def agrade_submission(key, submitted):
+    # Нечёткое сравнение грузит CPU: в async-режиме не держим им цикл событий
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(grading_executor(), grade_submission, key, submitted)
+
+
+def pack_answers(graded):
+    # Ответы целиком лежат в строке результата:
+    # [question_id, answer, match_score, is_correct, correct_answer_id, correct_text]
+    return [
+        [answer.question_id, answer.answer, answer.match_score, answer.is_correct, answer.correct_answer_id, answer.correct_text]
+        for answer in graded.answers
+    ]
+
+
+def unpack_answers(rows):
+    return GradedSubmission(answers=[GradedAnswer(*row) for row in rows])
+
+
+def save_attempt_rows(submissions, batch_size=None):
+    # submissions: (результат, проверенная сдача, время сдачи)
+    attempts = iter(QuizAttempt.objects.bulk_create(
+        [
+            QuizAttempt(
+                user_id=result.student_id,
+                question_id=answer.question_id,
+                answer=answer.answer,
+                match_score=answer.match_score,
+                is_correct=answer.is_correct,
+                correct_answer_id=answer.correct_answer_id,
+                correct_text=answer.correct_text,
+                created_at=created_at,
+            )
+            for result, graded, created_at in submissions
+            for answer in graded.answers
+        ],
+        batch_size=batch_size,
+    ))
+    Link = QuizResult.attempts.through
+    Link.objects.bulk_create(
+        [
+            Link(quizresult_id=result.pk, quizattempt_id=next(attempts).pk)
+            for result, graded, _ in submissions
+            for _ in graded.answers
+        ],
+        batch_size=batch_size,
+    )
+
+
+def save_submission(quiz, user, graded):
+    with transaction.atomic():
+        # Параллельная отправка той же попытки упрётся в unique_quiz_result_number
+        result = QuizResult.objects.create(
+            quiz=quiz, student=user, score=graded.score, answers=pack_answers(graded),
+            number=next_attempt_number(quiz, user),
+        )
+        record_scores([result])
+        if settings.QUIZ_ATTEMPT_ROWS:
+            save_attempt_rows([(result, graded, timezone.now())])
+        if settings.QUIZ_ANALYTICS_LIVE:
+            record_submission(quiz, graded)
+    return result
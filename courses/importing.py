@@ -0,0 +1,238 @@
+import time
+from dataclasses import asdict, dataclass
+from django.db import transaction
+from courses.cache import invalidate_course
+from courses.counters import add_to_counter
+from courses.grading import invalidate_answer_key
+from courses.models import Answer, Question, Quiz
+from courses.search import index_quiz_questions
+from courses.utils import iter_quiz_rows
+
+IMPORT_BATCH_SIZE = 1000
+QUESTION_MAX_LENGTH = Question._meta.get_field('text').max_length
+
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    rows_skipped: int = 0
+    duplicates: int = 0
+    questions_created: int = 0
+    questions_updated: int = 0
+    questions_deleted: int = 0
+    answers_created: int = 0
+    answers_updated: int = 0
+    answers_deleted: int = 0
+    questions_without_correct: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def changed(self):
+        return any((
+            self.questions_created, self.questions_updated, self.questions_deleted,
+            self.answers_created, self.answers_updated, self.answers_deleted,
+        ))
+
+    def as_dict(self):
+        return asdict(self)
+
+    def summary(self):
+        summary = (
+            f"вопросов: {self.questions_created}, ответов: {self.answers_created}, "
+            f"пропущено строк: {self.rows_skipped}, дубликатов: {self.duplicates}"
+        )
+        if self.questions_updated or self.answers_updated or self.answers_deleted:
+            summary += (
+                f", изменено вопросов: {self.questions_updated}, изменено ответов: {self.answers_updated}, "
+                f"удалено ответов: {self.answers_deleted}"
+            )
+        if self.questions_deleted:
+            summary += f", удалено вопросов: {self.questions_deleted}"
+        return summary
+
+
+class QuizImporter:
+    def __init__(self, quiz, batch_size=IMPORT_BATCH_SIZE, on_progress=None):
+        self.quiz = quiz
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.report = ImportReport()
+        self.question_ids = {}
+        self.pending_questions = {}
+        self.pending_answers = []
+        self.seen_answers = set()
+        self.seen_questions = set()
+        self.with_correct = set()
+
+    def run(self, file_obj):
+        started = time.monotonic()
+        with transaction.atomic():
+            self.prepare()
+            for question_text, answer_text, is_correct in iter_quiz_rows(file_obj):
+                self.add_row(question_text, answer_text, is_correct)
+            self.flush()
+            self.finish()
+            if self.report.changed:
+                # Удалённые вопросы вычитает сигнал post_delete, bulk_create сигналов не шлёт
+                add_to_counter(Quiz, self.quiz.pk, 'question_count', self.report.questions_created)
+                invalidate_answer_key(self.quiz.pk)
+                # Число вопросов выводится на странице курса
+                invalidate_course(self.quiz.course_id)
+                index_quiz_questions(self.quiz)
+        self.report.questions_without_correct = len(self.seen_questions - self.with_correct)
+        self.report.elapsed = round(time.monotonic() - started, 3)
+        return self.report
+
+    def prepare(self):
+        _, deleted = self.quiz.questions.all().delete()
+        self.report.questions_deleted = deleted.get(Question._meta.label, 0)
+
+    def finish(self):
+        pass
+
+    def question_key(self, text):
+        return text
+
+    def answer_key(self, text):
+        return text
+
+    def add_row(self, question_text, answer_text, is_correct):
+        self.report.rows_read += 1
+        if not question_text or not answer_text or len(question_text) > QUESTION_MAX_LENGTH:
+            self.report.rows_skipped += 1
+            return
+        question_key = self.question_key(question_text)
+        row_hash = hash((question_key, self.answer_key(answer_text)))
+        if row_hash in self.seen_answers:
+            self.report.duplicates += 1
+            return
+        self.seen_answers.add(row_hash)
+        self.seen_questions.add(question_key)
+        if is_correct:
+            self.with_correct.add(question_key)
+
+        self.add_answer(question_key, question_text, answer_text, is_correct)
+        if len(self.pending_answers) >= self.batch_size:
+            self.flush()
+
+    def add_answer(self, question_key, question_text, answer_text, is_correct):
+        if question_key not in self.question_ids and question_key not in self.pending_questions:
+            self.pending_questions[question_key] = Question(quiz=self.quiz, text=question_text)
+        self.pending_answers.append((question_key, Answer(text=answer_text, is_correct=is_correct)))
+
+    def flush(self):
+        if self.pending_questions:
+            keys = list(self.pending_questions)
+            created = Question.objects.bulk_create(self.pending_questions.values(), batch_size=self.batch_size)
+            self.question_ids.update((key, question.pk) for key, question in zip(keys, created))
+            self.report.questions_created += len(created)
+            self.pending_questions = {}
+        if self.pending_answers:
+            answers = []
+            for question_key, answer in self.pending_answers:
+                answer.question_id = self.question_ids[question_key]
+                answers.append(answer)
+            Answer.objects.bulk_create(answers, batch_size=self.batch_size)
+            self.report.answers_created += len(answers)
+            self.pending_answers = []
+        if self.on_progress:
+            self.on_progress(self.report)
+
+
+def normalize_text(text):
+    return ' '.join(text.lower().split())
+
+
+class IncrementalQuizImporter(QuizImporter):
+    # Сопоставляет строки файла с существующими вопросами и ответами по
+    # нормализованному тексту и пишет только разницу: первичные ключи и
+    # история попыток у совпавших вопросов сохраняются
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.existing_questions = {}
+        self.existing_answers = {}
+        self.matched_questions = set()
+        self.duplicate_questions = []
+        self.duplicate_answers = []
+        self.question_updates = []
+        self.answer_updates = []
+
+    def question_key(self, text):
+        return normalize_text(text)
+
+    def answer_key(self, text):
+        return normalize_text(text)
+
+    def prepare(self):
+        questions = self.quiz.questions.order_by('id').values_list('id', 'text')
+        for question_id, text in questions.iterator(chunk_size=self.batch_size):
+            key = self.question_key(text)
+            if key in self.existing_questions:
+                self.duplicate_questions.append(question_id)
+            else:
+                self.existing_questions[key] = (question_id, text)
+        answers = Answer.objects.filter(question__quiz=self.quiz).order_by('id').values_list(
+            'id', 'question_id', 'text', 'is_correct'
+        )
+        for answer_id, question_id, text, is_correct in answers.iterator(chunk_size=self.batch_size):
+            question_answers = self.existing_answers.setdefault(question_id, {})
+            key = self.answer_key(text)
+            if key in question_answers:
+                self.duplicate_answers.append(answer_id)
+            else:
+                question_answers[key] = (answer_id, text, is_correct)
+
+    def add_answer(self, question_key, question_text, answer_text, is_correct):
+        existing_question = self.existing_questions.get(question_key)
+        if existing_question is None:
+            super().add_answer(question_key, question_text, answer_text, is_correct)
+            return
+
+        question_id, current_text = existing_question
+        if question_id not in self.matched_questions:
+            self.matched_questions.add(question_id)
+            self.question_ids[question_key] = question_id
+            if current_text != question_text:
+                self.question_updates.append(Question(pk=question_id, text=question_text))
+
+        existing_answer = self.existing_answers.get(question_id, {}).pop(self.answer_key(answer_text), None)
+        if existing_answer is None:
+            self.pending_answers.append((question_key, Answer(text=answer_text, is_correct=is_correct)))
+        elif existing_answer[1:] != (answer_text, is_correct):
+            self.answer_updates.append(Answer(pk=existing_answer[0], text=answer_text, is_correct=is_correct))
+            if len(self.answer_updates) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        super().flush()
+        if self.question_updates:
+            Question.objects.bulk_update(self.question_updates, ['text'], batch_size=self.batch_size)
+            self.report.questions_updated += len(self.question_updates)
+            self.question_updates = []
+        if self.answer_updates:
+            Answer.objects.bulk_update(self.answer_updates, ['text', 'is_correct'], batch_size=self.batch_size)
+            self.report.answers_updated += len(self.answer_updates)
+            self.answer_updates = []
+
+    def finish(self):
+        stale_answers = self.duplicate_answers + [
+            answer_id
+            for question_id in self.matched_questions
+            for answer_id, _, _ in self.existing_answers.get(question_id, {}).values()
+        ]
+        stale_questions = self.duplicate_questions + [
+            question_id
+            for question_id, _ in self.existing_questions.values()
+            if question_id not in self.matched_questions
+        ]
+        for start in range(0, len(stale_answers), self.batch_size):
+            batch = stale_answers[start:start + self.batch_size]
+            self.report.answers_deleted += Answer.objects.filter(pk__in=batch).delete()[0]
+        for start in range(0, len(stale_questions), self.batch_size):
+            _, deleted = Question.objects.filter(pk__in=stale_questions[start:start + self.batch_size]).delete()
+            self.report.questions_deleted += deleted.get(Question._meta.label, 0)
+
+
+def import_quiz_questions(quiz, file_obj, batch_size=IMPORT_BATCH_SIZE, incremental=False):
+    importer_class = IncrementalQuizImporter if incremental else QuizImporter
+    return importer_class(quiz, batch_size=batch_size).run(file_obj)
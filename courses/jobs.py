@@ -0,0 +1,164 @@
+import logging
+import os
+import socket
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from courses.importing import IncrementalQuizImporter, QuizImporter
+from courses.models import ImportJob
+from courses.results import open_retake
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = timedelta(minutes=10)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def should_import_in_background(file_obj):
+    return file_obj.size > settings.QUIZ_IMPORT_ASYNC_THRESHOLD
+
+
+def enqueue_import(quiz, owner, file_obj, restart_quiz=False, incremental=False):
+    return ImportJob.objects.create(
+        quiz=quiz,
+        owner=owner,
+        file=file_obj,
+        file_size=file_obj.size,
+        restart_quiz=restart_quiz,
+        incremental=incremental,
+    )
+
+
+def claim_next_job(worker=None):
+    # Два импорта в один тест одновременно не запускаем. Фильтр ниже только отсекает заведомо занятые
+    # тесты, гонку между воркерами закрывает ограничение one_running_import_per_quiz
+    candidates = (
+        ImportJob.objects
+        .filter(status=ImportJob.PENDING)
+        .exclude(quiz__import_jobs__status=ImportJob.RUNNING)
+        .order_by('created_at')
+    )
+    for job_id in candidates.values_list('pk', flat=True)[:20]:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.PENDING).update(
+                    status=ImportJob.RUNNING,
+                    started_at=now,
+                    heartbeat_at=now,
+                    worker=worker or worker_name(),
+                )
+        except IntegrityError:
+            # Другой воркер успел взять задачу этого же теста
+            continue
+        if claimed:
+            return ImportJob.objects.select_related('quiz', 'owner').get(pk=job_id)
+    return None
+
+
+def send_heartbeat(job_ids):
+    if not job_ids:
+        return
+    try:
+        ImportJob.objects.filter(pk__in=job_ids, status=ImportJob.RUNNING).update(heartbeat_at=timezone.now())
+    except DatabaseError:
+        logger.warning('Could not save heartbeat of import jobs %s', job_ids, exc_info=True)
+
+
+def requeue_stale_jobs(older_than):
+    # Возвращаем только задачи, чей воркер перестал подавать сигнал: живой воркер обновляет
+    # heartbeat_at каждые HEARTBEAT_INTERVAL секунд, сколько бы ни шёл импорт
+    cutoff = timezone.now() - older_than
+    return ImportJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=ImportJob.RUNNING,
+    ).update(status=ImportJob.PENDING, started_at=None, heartbeat_at=None, worker='')
+
+
+class ProgressReporter:
+    # Импорт идёт в одной транзакции, поэтому прогресс пишем из отдельного
+    # потока: у него своё соединение с БД и запись видна сразу.
+    # SQLite держит блокировку записи на всю транзакцию импорта, там прогресс
+    # появится только по завершении задачи.
+    def __init__(self):
+        self.enabled = connection.vendor != 'sqlite'
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-progress')
+
+    def report(self, job_id, rows_processed):
+        if self.enabled:
+            self.executor.submit(self._save, job_id, rows_processed)
+
+    def _save(self, job_id, rows_processed):
+        try:
+            ImportJob.objects.filter(pk=job_id, rows_processed__lt=rows_processed).update(rows_processed=rows_processed)
+        except DatabaseError:
+            logger.warning('Could not save progress of import job %s', job_id, exc_info=True)
+
+    def close(self):
+        self.executor.submit(connection.close)
+        self.executor.shutdown(wait=True)
+
+
+def run_import_job(job, progress=None):
+    def on_progress(report):
+        if progress:
+            progress.report(job.pk, report.rows_read)
+
+    try:
+        with job.file.open('rb') as file_obj:
+            importer_class = IncrementalQuizImporter if job.incremental else QuizImporter
+            report = importer_class(job.quiz, on_progress=on_progress).run(file_obj)
+        if job.restart_quiz:
+            open_retake(job.quiz, job.owner)
+    except Exception as exc:
+        logger.exception('Import job %s failed', job.pk)
+        job.status = ImportJob.FAILED
+        job.error = str(exc)
+    else:
+        job.status = ImportJob.DONE
+        job.rows_processed = report.rows_read
+        job.report = report.as_dict()
+        job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'rows_processed', 'report', 'file', 'finished_at'])
+    return job
+
+
+def _run_in_thread(job, progress):
+    try:
+        return run_import_job(job, progress)
+    finally:
+        connection.close()
+
+
+def run_pending_jobs(workers=2, progress=None, max_jobs=None):
+    worker = worker_name()
+    processed = 0
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-worker') as executor:
+        while True:
+            # Берём задачу из очереди только когда есть свободный поток
+            if len(running) < workers:
+                # Задачи упавших воркеров держат тест занятым, возвращаем их на каждом круге
+                requeue_stale_jobs(STALE_AFTER)
+            while len(running) < workers and (max_jobs is None or processed < max_jobs):
+                job = claim_next_job(worker)
+                if job is None:
+                    break
+                running[executor.submit(_run_in_thread, job, progress)] = job.pk
+                processed += 1
+            if not running:
+                break
+            done, _ = wait(running, timeout=HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                future.result()
+            send_heartbeat(list(running.values()))
+    return processed
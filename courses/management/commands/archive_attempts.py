@@ -0,0 +1,25 @@
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from courses.archive import ARCHIVE_BATCH_SIZE, archive_attempts, drop_archived_months, hot_window_start
+
+
+class Command(BaseCommand):
+    help = 'Переносит попытки старше горячего окна в архив и удаляет старые месяцы архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.QUIZ_ATTEMPT_HOT_DAYS, help='Горячее окно в днях')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--drop-before', help='Удалить из архива месяцы раньше указанного, формат ГГГГ-ММ')
+
+    def handle(self, *args, **options):
+        archived = archive_attempts(hot_window_start(options['days']), batch_size=options['batch_size'])
+        self.stdout.write(f'Перенесено в архив попыток: {archived}')
+
+        if options['drop_before']:
+            try:
+                year, month = map(int, options['drop_before'].split('-'))
+                before_month = date(year, month, 1)
+            except ValueError:
+                raise CommandError('Месяц указывается в формате ГГГГ-ММ')
+            self.stdout.write(f'Удалено из архива попыток: {drop_archived_months(before_month)}')
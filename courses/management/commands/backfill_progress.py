@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from courses.progress import backfill_course_progress
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводную таблицу прогресса студентов по курсам из Progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = backfill_course_progress(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Сводок прогресса: {created}'))
@@ -0,0 +1,63 @@
+import json
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from courses.benchmarks import measure_hot_queries, set_query_pattern_indexes
+from courses.datasets import DatasetSpec, generate_dataset
+from courses.models import QuizResult
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные и сравнивает планы и время горячих запросов '
+        'без индексов и с ними. Все изменения откатываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--results-per-user', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        spec = DatasetSpec(
+            users=options['users'],
+            courses=options['courses'],
+            questions_per_quiz=options['questions'],
+            results_per_user=options['results_per_user'],
+            seed=options['seed'],
+            prefix='idxbench',
+        )
+        constraints_disabled = connection.disable_constraint_checking()
+        try:
+            before, after, counts = self.run_benchmark(spec, options['repeat'])
+        finally:
+            if constraints_disabled:
+                connection.enable_constraint_checking()
+
+
+        for name in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, data in (('без индексов', before[name]), ('с индексами', after[name])):
+                self.stdout.write(f"  {label}: median {data['median_ms']} ms, p95 {data['p95_ms']} ms")
+                for line in data['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({'dataset': counts, 'spec': spec.as_dict(), 'before': before, 'after': after}, output, ensure_ascii=False, indent=2)
+
+    def run_benchmark(self, spec, repeat):
+        with transaction.atomic():
+            counts = generate_dataset(spec)
+            result = QuizResult.objects.select_related('quiz__course__owner', 'student').order_by('pk').first()
+            quiz, student, owner = result.quiz, result.student, result.quiz.course.owner
+
+            set_query_pattern_indexes(False)
+            before = measure_hot_queries(quiz, student, owner, repeat=repeat)
+            set_query_pattern_indexes(True)
+            after = measure_hot_queries(quiz, student, owner, repeat=repeat)
+            transaction.set_rollback(True)
+        return before, after, counts
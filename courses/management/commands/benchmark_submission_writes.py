@@ -0,0 +1,63 @@
+import json
+import random
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.benchmarks import measure_submission_writes
+from courses.datasets import DatasetSpec, generate_dataset
+from courses.grading import build_answer_key, grade_submission
+from courses.models import Answer, Quiz
+from courses.submissions import DRAIN_BATCH_SIZE
+
+PREFIX = 'writebench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает число пишущих запросов при сдаче теста сразу в результаты и через буфер '
+        'с переносом пачками. Данные создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=5000)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=DRAIN_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            generate_dataset(DatasetSpec(
+                users=options['submissions'], courses=1, modules_per_course=1, quizzes_per_course=1,
+                questions_per_quiz=options['questions'], enrollments_per_user=1, results_per_user=0,
+                seed=options['seed'], prefix=PREFIX,
+            ))
+            quiz = Quiz.objects.filter(course__owner__username__startswith=f'{PREFIX}_user_').first()
+            students = list(User.objects.filter(username__startswith=f'{PREFIX}_user_').order_by('pk'))
+            submissions = self.build_submissions(quiz, students, random.Random(options['seed']))
+            report = measure_submission_writes(submissions, batch_size=options['batch_size'])
+            transaction.set_rollback(True)
+
+        for mode, data in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(mode))
+            for key, value in data.items():
+                self.stdout.write(f'  {key}: {value}')
+        direct, buffered = report['direct']['writes'], report['buffered']['writes']
+        if direct:
+            self.stdout.write(f'Пишущих запросов меньше на {(direct - buffered) / direct * 100:.1f}%')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({'submissions': len(submissions), 'questions': options['questions'], **report}, output, ensure_ascii=False, indent=2)
+
+    def build_submissions(self, quiz, students, rng):
+        key = build_answer_key(quiz)
+        correct = dict(Answer.objects.filter(question__quiz=quiz, is_correct=True).values_list('question_id', 'text'))
+        submissions = []
+        for student in students:
+            submitted = {
+                question_id: correct.get(question_id, '') if rng.random() < 0.6 else 'не знаю'
+                for question_id in key.question_ids
+            }
+            submissions.append((quiz, student, grade_submission(key, submitted)))
+        return submissions
@@ -0,0 +1,48 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from courses.benchmarks import measure_views, pick_subjects, view_scenarios
+from courses.datasets import DatasetSpec, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные страницы через тестовый клиент и считает перцентили '
+        'задержки и число запросов к БД. Все изменения откатываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help='Префикс набора из generate_dataset')
+        parser.add_argument('--generate', action='store_true', help='Создать набор данных на время замера')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--courses', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['generate']:
+                if User.objects.filter(username__startswith=f"{options['prefix']}_user_").exists():
+                    raise CommandError(f"Набор с префиксом \"{options['prefix']}\" уже есть, --generate не нужен")
+                generate_dataset(DatasetSpec(
+                    users=options['users'], courses=options['courses'], seed=options['seed'], prefix=options['prefix'],
+                ))
+            student, owner, quiz = pick_subjects(options['prefix'])
+            report = {
+                'subjects': {'student': student.pk, 'owner': owner.pk, 'quiz': quiz.pk},
+                'views': measure_views(view_scenarios(student, owner, quiz), options['repeat'], options['warmup']),
+            }
+            transaction.set_rollback(True)
+
+        for name, data in report['views'].items():
+            self.stdout.write(
+                f"{name:<18} {data['method']:<4} {','.join(map(str, data['statuses'])):<8} "
+                f"p50 {data['p50_ms']:>8} ms  p95 {data['p95_ms']:>8} ms  p99 {data['p99_ms']:>8} ms  "
+                f"запросов {data['queries_min']}-{data['queries_max']}"
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from courses.analytics import compact_quiz_stats
+from courses.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегированную статистику тестов из результатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quizzes', help='id теста, можно несколько')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.order_by('pk')
+        if options['quizzes']:
+            quizzes = quizzes.filter(pk__in=options['quizzes'])
+        for quiz in quizzes.iterator():
+            results, questions = compact_quiz_stats(quiz)
+            self.stdout.write(f'{quiz.pk} {quiz.title}: результатов {results}, вопросов со статистикой {questions}')
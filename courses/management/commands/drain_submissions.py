@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from courses.submissions import DRAIN_BATCH_SIZE, drain_submissions
+
+
+class Command(BaseCommand):
+    help = 'Переносит сдачи из буфера в результаты и попытки пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DRAIN_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='Разобрать буфер и выйти')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                drained = 0
+                while True:
+                    count = drain_submissions(options['batch_size'])
+                    drained += count
+                    if count < options['batch_size']:
+                        break
+                if drained:
+                    self.stdout.write(f'Перенесено сдач: {drained}')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
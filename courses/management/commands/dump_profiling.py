@@ -0,0 +1,24 @@
+import json
+from django.core.management.base import BaseCommand
+from courses.profiling import clear_profiles, collect_profiles, summarize
+
+
+class Command(BaseCommand):
+    help = 'Выгружает в JSON данные профилирования запросов из снимков всех процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw', action='store_true', help='Выгрузить сами запросы, а не сводку по view')
+        parser.add_argument('--output', help='Путь к файлу, по умолчанию stdout')
+        parser.add_argument('--clear', action='store_true', help='Удалить снимки после выгрузки')
+
+    def handle(self, *args, **options):
+        entries = collect_profiles()
+        data = entries if options['raw'] else {'requests': len(entries), 'views': summarize(entries)}
+        dump = json.dumps(data, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(dump)
+        else:
+            self.stdout.write(dump)
+        if options['clear']:
+            clear_profiles()
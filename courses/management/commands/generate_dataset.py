@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from courses.datasets import DEFAULT_PASSWORD, DatasetSpec, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Создаёт воспроизводимый синтетический набор данных для нагрузочных замеров'
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--courses', type=int, default=defaults.courses)
+        parser.add_argument('--modules-per-course', type=int, default=defaults.modules_per_course)
+        parser.add_argument('--quizzes-per-course', type=int, default=defaults.quizzes_per_course)
+        parser.add_argument('--questions-per-quiz', type=int, default=defaults.questions_per_quiz)
+        parser.add_argument('--answers-per-question', type=int, default=defaults.answers_per_question)
+        parser.add_argument('--enrollments-per-user', type=int, default=defaults.enrollments_per_user)
+        parser.add_argument('--results-per-user', type=int, default=defaults.results_per_user)
+        parser.add_argument('--completion-rate', type=float, default=defaults.completion_rate)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--prefix', default=defaults.prefix, help='Префикс имён пользователей')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        spec = DatasetSpec(**{name: options[name] for name in DatasetSpec().as_dict()})
+        if User.objects.filter(username__startswith=f'{spec.prefix}_user_').exists():
+            raise CommandError(f'Пользователи с префиксом "{spec.prefix}" уже есть, укажите другой --prefix')
+        counts = generate_dataset(spec, batch_size=options['batch_size'])
+        for model, count in counts.items():
+            self.stdout.write(f'{model}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, вход: {spec.prefix}_user_N / {DEFAULT_PASSWORD}'))
@@ -0,0 +1,153 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from courses.datasets import DEFAULT_PASSWORD
+from courses.models import Quiz, QuizScoreSummary
+from courses.utils import percentile
+
+
+class Session:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def cookie(self, name):
+        return next((cookie.value for cookie in self.cookies if cookie.name == name), '')
+
+    def request(self, path, data=None, headers=None, method=None):
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {}, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+    def login(self, username, password):
+        self.request('/login/')
+        form = urllib.parse.urlencode({
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.cookie('csrftoken'),
+        }).encode()
+        self.request('/login/', data=form, headers={'Referer': self.base_url + '/login/'})
+        if not self.cookie('sessionid'):
+            raise CommandError(f'Не удалось войти как {username}')
+
+    def submit(self, quiz_id, answers):
+        body = json.dumps({'answers': answers}).encode()
+        return self.request(
+            f'/api/v1/quizzes/{quiz_id}/submissions/',
+            data=body,
+            headers={
+                'Content-Type': 'application/json',
+                'X-CSRFToken': self.cookie('csrftoken'),
+                'Referer': self.base_url + '/',
+            },
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон отправки ответов через API против запущенного сервера. '
+        'Запустите один раз против WSGI (gunicorn config.wsgi) и один раз против '
+        'ASGI (uvicorn config.asgi:application) с одинаковыми параметрами и сравните отчёты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--prefix', default='bench', help='Пользователи из generate_dataset')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--quiz', type=int, help='id теста, по умолчанию первый тест курсов этих пользователей')
+        parser.add_argument('--reset', action='store_true', help='Открыть этим пользователям повторное прохождение')
+        parser.add_argument('--label', default='', help='Подпись прогона в отчёте, например asgi')
+        parser.add_argument('--baseline', help='JSON-отчёт прошлого прогона для сравнения')
+        parser.add_argument('--output', help='Путь к JSON-файлу с результатами')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.order_by('pk')
+        if options['quiz']:
+            quiz = quizzes.filter(pk=options['quiz']).first()
+        else:
+            quiz = quizzes.filter(course__enrollments__student__username__startswith=f"{options['prefix']}_user_").first()
+        if quiz is None:
+            raise CommandError('Тест не найден')
+        users = list(
+            User.objects.filter(username__startswith=f"{options['prefix']}_user_")
+            .order_by('pk').values_list('pk', 'username')[:options['users']]
+        )
+        summaries = QuizScoreSummary.objects.filter(quiz=quiz)
+        if options['reset']:
+            summaries.filter(student_id__in=[pk for pk, _ in users]).update(retaking=True)
+        taken = set(summaries.filter(retaking=False, last_result__isnull=False).values_list('student_id', flat=True))
+        usernames = [username for pk, username in users if pk not in taken]
+        if not usernames:
+            raise CommandError('Нет пользователей без результата: запустите generate_dataset или укажите --reset')
+
+        answers = [
+            {'question_id': question_id, 'answer': f'Ответ {question_id}'}
+            for question_id in quiz.questions.order_by('id').values_list('id', flat=True)
+        ]
+
+        # Вход выполняем заранее, замеряем только отправку ответов
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            def login(username):
+                session = Session(options['url'])
+                session.login(username, DEFAULT_PASSWORD)
+                return session
+            sessions = list(executor.map(login, usernames))
+
+        timings = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def submit(session):
+            started = time.perf_counter()
+            status, _ = session.submit(quiz.pk, answers)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                timings.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(submit, sessions))
+        elapsed = time.perf_counter() - started
+
+        report = {
+            'label': options['label'],
+            'url': options['url'],
+            'quiz': quiz.pk,
+            'questions': len(answers),
+            'submissions': len(timings),
+            'concurrency': options['concurrency'],
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'elapsed_s': round(elapsed, 3),
+            'submissions_per_s': round(statuses.get(201, 0) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+        }
+        for key, value in report.items():
+            self.stdout.write(f'{key}: {value}')
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+            for key in ('submissions_per_s', 'p50_ms', 'p99_ms'):
+                if baseline.get(key):
+                    change = (report[key] - baseline[key]) / baseline[key] * 100
+                    self.stdout.write(f"{key}: {baseline[key]} → {report[key]} ({change:+.1f}%)")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
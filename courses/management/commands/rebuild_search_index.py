@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from courses.search import SEARCH_BATCH_SIZE, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс по курсам, модулям и вопросам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SEARCH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано документов: {total}'))
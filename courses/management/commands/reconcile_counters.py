@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from courses.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики модулей, тестов, студентов и вопросов с таблицами и чинит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(dry_run=options['dry_run'])
+        for name, rows in drift.items():
+            self.stdout.write(f'{name:<24} расхождений: {rows}')
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} строк: {sum(drift.values())}'))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from courses.jobs import ProgressReporter, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь фоновых импортов вопросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и выйти')
+
+    def handle(self, *args, **options):
+        progress = ProgressReporter()
+        try:
+            while True:
+                processed = run_pending_jobs(workers=options['workers'], progress=progress)
+                if processed:
+                    self.stdout.write(f'Обработано задач: {processed}')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            progress.close()
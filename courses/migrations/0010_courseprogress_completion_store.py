@@ -0,0 +1,72 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.utils import timezone
+
+
+def copy_completed_to_progress(apps, schema_editor):
+    Module = apps.get_model('courses', 'Module')
+    Progress = apps.get_model('courses', 'Progress')
+    now = timezone.now()
+    links = Module.completed.through.objects.values_list('user_id', 'module_id')
+    batch = []
+    for student_id, module_id in links.iterator(chunk_size=2000):
+        batch.append(Progress(student_id=student_id, module_id=module_id, completed_at=now))
+        if len(batch) >= 2000:
+            Progress.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Progress.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_course_progress(apps, schema_editor):
+    Progress = apps.get_model('courses', 'Progress')
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    rows = (
+        Progress.objects
+        .values('student_id', course_id=F('module__course_id'))
+        .annotate(total=Count('pk'))
+        .order_by()
+    )
+    CourseProgress.objects.bulk_create(
+        [
+            CourseProgress(student_id=row['student_id'], course_id=row['course_id'], completed_modules=row['total'])
+            for row in rows.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_quizresult_attempts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_modules', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(copy_completed_to_progress, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='module',
+            name='completed',
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='completed',
+            field=models.ManyToManyField(blank=True, related_name='completed_modules', through='courses.Progress', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_course_progress, migrations.RunPython.noop),
+    ]
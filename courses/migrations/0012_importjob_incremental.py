@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+    ]
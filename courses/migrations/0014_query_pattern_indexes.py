@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def dedupe_quiz_results(apps, schema_editor):
+    # Оставляем самый поздний результат студента по тесту
+    QuizResult = apps.get_model('courses', 'QuizResult')
+    duplicates = (
+        QuizResult.objects
+        .values('quiz_id', 'student_id')
+        .annotate(total=Count('pk'), keep=Max('pk'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        QuizResult.objects.filter(quiz_id=row['quiz_id'], student_id=row['student_id']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_quiz_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('is_correct', True)), fields=['question'], name='answer_correct_by_question'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['owner', '-created_at'], name='course_owner_created'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['user', 'question'], name='attempt_user_question'),
+        ),
+        migrations.RunPython(dedupe_quiz_results, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='quizresult',
+            constraint=models.UniqueConstraint(fields=('quiz', 'student'), name='unique_quiz_result'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:28
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_postgres_indexes(apps, schema_editor):
+    # GIN-индексы есть только в PostgreSQL, на других базах работает SearchToken
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX search_document_vector ON courses_searchdocument USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX search_document_title_trgm ON courses_searchdocument USING gin (title gin_trgm_ops)'
+    )
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS search_document_vector')
+    schema_editor.execute('DROP INDEX IF EXISTS search_document_title_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_course_catalogue_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Курс'), ('module', 'Модуль'), ('question', 'Вопрос')], max_length=10)),
+                ('title', models.CharField(max_length=500)),
+                ('body', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='courses.course')),
+                ('module', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='courses.module')),
+                ('question', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='courses.question')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='courses.searchdocument')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'course')), fields=('course',), name='unique_course_search_document'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['token', 'document'], name='search_token_lookup'),
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def pack_result_answers(apps, schema_editor):
+    QuizResult = apps.get_model('courses', 'QuizResult')
+    Link = QuizResult.attempts.through
+    result_ids = QuizResult.objects.order_by('pk').values_list('pk', flat=True)
+    chunk = []
+    for result_id in result_ids.iterator(chunk_size=1000):
+        chunk.append(result_id)
+        if len(chunk) >= 1000:
+            _pack_chunk(QuizResult, Link, chunk)
+            chunk = []
+    _pack_chunk(QuizResult, Link, chunk)
+
+
+def _pack_chunk(QuizResult, Link, result_ids):
+    if not result_ids:
+        return
+    answers = {}
+    rows = (
+        Link.objects.filter(quizresult_id__in=result_ids)
+        .order_by('quizresult_id', 'quizattempt__question_id', 'quizattempt_id')
+        .values_list(
+            'quizresult_id', 'quizattempt__question_id', 'quizattempt__answer',
+            'quizattempt__match_score', 'quizattempt__is_correct',
+        )
+    )
+    for result_id, question_id, answer, match_score, is_correct in rows:
+        answers.setdefault(result_id, []).append([question_id, answer or '', match_score, is_correct])
+    QuizResult.objects.bulk_update(
+        [QuizResult(pk=result_id, answers=packed) for result_id, packed in answers.items()],
+        ['answers'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_pending_submission'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizresult',
+            name='answers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='QuizAttemptArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.CharField(blank=True, max_length=255, null=True)),
+                ('match_score', models.FloatField(default=0.0)),
+                ('is_correct', models.BooleanField()),
+                ('created_at', models.DateTimeField()),
+                ('month', models.DateField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.question')),
+                ('result', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_attempts', to='courses.quizresult')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='attempt_archive_month')],
+            },
+        ),
+        migrations.RunPython(pack_result_answers, migrations.RunPython.noop),
+    ]
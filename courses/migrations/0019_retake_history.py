@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_score_summaries(apps, schema_editor):
+    QuizResult = apps.get_model('courses', 'QuizResult')
+    QuizScoreSummary = apps.get_model('courses', 'QuizScoreSummary')
+    # До этой миграции у студента был ровно один результат на тест
+    rows = QuizResult.objects.order_by('pk').values_list('pk', 'quiz_id', 'student_id', 'score')
+    batch = []
+    for result_id, quiz_id, student_id, score in rows.iterator(chunk_size=2000):
+        batch.append(QuizScoreSummary(
+            quiz_id=quiz_id, student_id=student_id, attempts=1, best_score=score, best_number=1,
+            last_score=score, last_result_id=result_id,
+        ))
+        if len(batch) >= 2000:
+            QuizScoreSummary.objects.bulk_create(batch)
+            batch = []
+    QuizScoreSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_compact_attempts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizScoreSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('best_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('best_number', models.PositiveIntegerField(null=True)),
+                ('last_score', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('retaking', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='pendingsubmission',
+            name='unique_pending_submission',
+        ),
+        migrations.RemoveConstraint(
+            model_name='quizresult',
+            name='unique_quiz_result',
+        ),
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='number',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='quizresult',
+            name='number',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name='pendingsubmission',
+            constraint=models.UniqueConstraint(fields=('quiz', 'student', 'number'), name='unique_pending_submission'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizresult',
+            constraint=models.UniqueConstraint(fields=('quiz', 'student', 'number'), name='unique_quiz_result_number'),
+        ),
+        migrations.AddField(
+            model_name='quizscoresummary',
+            name='last_result',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.quizresult'),
+        ),
+        migrations.AddField(
+            model_name='quizscoresummary',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_summaries', to='courses.quiz'),
+        ),
+        migrations.AddField(
+            model_name='quizscoresummary',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='quizscoresummary',
+            constraint=models.UniqueConstraint(fields=('quiz', 'student'), name='unique_quiz_score_summary'),
+        ),
+        migrations.RunPython(backfill_score_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _first_correct(Answer, question_ids):
+    # Эталон ключа ответов — первый правильный ответ вопроса по pk
+    first = {}
+    rows = Answer.objects.filter(question_id__in=question_ids, is_correct=True).order_by('question_id', 'pk')
+    for answer_id, question_id, text in rows.values_list('pk', 'question_id', 'text'):
+        first.setdefault(question_id, (answer_id, text))
+    return first
+
+
+def snapshot_correct_answers(apps, schema_editor):
+    Answer = apps.get_model('courses', 'Answer')
+    QuizAttempt = apps.get_model('courses', 'QuizAttempt')
+    QuizResult = apps.get_model('courses', 'QuizResult')
+    correct = Answer.objects.filter(question_id=OuterRef('question_id'), is_correct=True).order_by('pk')
+    QuizAttempt.objects.update(
+        correct_answer_id=Subquery(correct.values('pk')[:1]),
+        correct_text=Coalesce(Subquery(correct.values('text')[:1]), Value('')),
+    )
+    rows = QuizResult.objects.exclude(answers=[]).order_by('pk').values_list('pk', 'answers')
+    chunk = []
+    for row in rows.iterator(chunk_size=1000):
+        chunk.append(row)
+        if len(chunk) >= 1000:
+            _snapshot_chunk(Answer, QuizResult, chunk)
+            chunk = []
+    _snapshot_chunk(Answer, QuizResult, chunk)
+
+
+def _snapshot_chunk(Answer, QuizResult, chunk):
+    if not chunk:
+        return
+    first = _first_correct(Answer, {row[0] for _, packed in chunk for row in packed})
+    updated = [
+        QuizResult(pk=result_id, answers=[
+            row[:4] + list(first.get(row[0], (None, ''))) for row in packed
+        ])
+        for result_id, packed in chunk
+    ]
+    QuizResult.objects.bulk_update(updated, ['answers'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_retake_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='correct_answer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.answer'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='correct_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='quizattemptarchive',
+            name='correct_answer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.answer'),
+        ),
+        migrations.AddField(
+            model_name='quizattemptarchive',
+            name='correct_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(snapshot_correct_answers, migrations.RunPython.noop),
+    ]
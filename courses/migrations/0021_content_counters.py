@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _counted(model, key):
+    rows = model.objects.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(total=Count('pk'))
+    return Coalesce(Subquery(rows.values('total'), output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Quiz = apps.get_model('courses', 'Quiz')
+    Course.objects.update(
+        module_count=_counted(apps.get_model('courses', 'Module'), 'course'),
+        quiz_count=_counted(Quiz, 'course'),
+        enrollment_count=_counted(apps.get_model('courses', 'Enrollment'), 'course'),
+    )
+    Quiz.objects.update(question_count=_counted(apps.get_model('courses', 'Question'), 'quiz'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_attempt_correct_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='module_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='quiz_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def sync_course_students(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    CourseStudent = Course.students.through
+    # Course.students не заполнялся, теперь он повторяет Enrollment
+    rows = Enrollment.objects.order_by('pk').values_list('course_id', 'student_id')
+    batch = []
+    for course_id, student_id in rows.iterator(chunk_size=2000):
+        batch.append(CourseStudent(course_id=course_id, user_id=student_id))
+        if len(batch) >= 2000:
+            CourseStudent.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    CourseStudent.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_content_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(sync_course_students, migrations.RunPython.noop),
+    ]
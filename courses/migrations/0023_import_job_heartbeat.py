@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def requeue_concurrent_jobs(apps, schema_editor):
+    ImportJob = apps.get_model('courses', 'ImportJob')
+    # Из нескольких выполняющихся импортов одного теста остаётся самый ранний
+    seen = set()
+    running = ImportJob.objects.filter(status='running').order_by('quiz_id', 'started_at', 'pk')
+    for job_id, quiz_id in running.values_list('pk', 'quiz_id'):
+        if quiz_id in seen:
+            ImportJob.objects.filter(pk=job_id).update(status='pending', started_at=None)
+        seen.add(quiz_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_sync_course_students'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(requeue_concurrent_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='importjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('quiz',), name='one_running_import_per_quiz'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_email_index(apps, schema_editor):
+    # Список студентов ищет пользователей по Lower('email'): обычный индекс по email тут не работает.
+    # auth_user принадлежит django.contrib.auth, поэтому индекс по выражению создаётся вручную
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = schema_editor.quote_name(User._meta.db_table)
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS user_email_lower ON {table} (LOWER(email))')
+
+
+def drop_email_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS user_email_lower')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0023_import_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
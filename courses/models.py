@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 class Course(models.Model):
     title = models.CharField(max_length=255)
@@ -8,6 +11,16 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     students = models.ManyToManyField(User, related_name='courses_joined', blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Счётчики ведутся через F() при записи, расхождения чинит reconcile_counters
+    module_count = models.PositiveIntegerField(default=0)
+    quiz_count = models.PositiveIntegerField(default=0)
+    enrollment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='course_owner_created'),
+            models.Index(fields=['-created_at', '-id'], name='course_catalogue_order'),
+        ]
 
     def __str__(self):
         return self.title
@@ -17,7 +30,7 @@ class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
     title = models.CharField(max_length=200)
     description = models.TextField()
-    completed = models.ManyToManyField(User, related_name='completed_modules', blank=True)
+    completed = models.ManyToManyField(User, through='Progress', related_name='completed_modules', blank=True)
 
     def is_completed_by(self, user):
         return self.completed.filter(pk=user.pk).exists()
@@ -47,10 +60,21 @@ class Progress(models.Model):
         unique_together = ['student', 'module']
 
 
+class CourseProgress(models.Model):
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_progress')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress')
+    completed_modules = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'course']
+
+
 class Quiz(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='quizzes')
     description = models.TextField(blank=True)
     title = models.CharField(max_length=255)
+    question_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -69,6 +93,11 @@ class Answer(models.Model):
     text = models.TextField()
     is_correct = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['question'], condition=models.Q(is_correct=True), name='answer_correct_by_question'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -78,6 +107,47 @@ class QuizResult(models.Model):
     score = models.DecimalField(max_digits=5, decimal_places=2)
     completed_at = models.DateTimeField(auto_now_add=True)
     attempts = models.ManyToManyField('QuizAttempt', related_name='results', blank=True)
+    # Упакованные ответы: [question_id, answer, match_score, is_correct] на каждый вопрос
+    answers = models.JSONField(default=list, blank=True)
+    # Номер попытки студента в этом тесте, повторное прохождение не удаляет прежние
+    number = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['quiz', 'student', 'number'], name='unique_quiz_result_number')]
+
+    @cached_property
+    def answer_rows(self):
+        # Строки попыток живут только в горячем окне, разбор строим из упакованных ответов
+        if not self.answers:
+            return list(self.attempts.select_related('question').order_by('question_id', 'pk'))
+        questions = Question.objects.in_bulk([row[0] for row in self.answers])
+        rows = []
+        for question_id, answer, match_score, is_correct, *correct in self.answers:
+            if question_id not in questions:
+                continue
+            # Ответы, упакованные до снимка правильного ответа, хранят только четыре поля
+            correct_answer_id, correct_text = correct or (None, '')
+            rows.append(QuizAttempt(
+                user_id=self.student_id, question=questions[question_id], answer=answer,
+                match_score=match_score, is_correct=is_correct, correct_answer_id=correct_answer_id,
+                correct_text=correct_text, created_at=self.completed_at,
+            ))
+        return rows
+
+class QuizScoreSummary(models.Model):
+    # Лучший и последний результат студента по тесту, чтобы не перебирать историю попыток
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='score_summaries')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_summaries')
+    attempts = models.PositiveIntegerField(default=0)
+    best_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    best_number = models.PositiveIntegerField(null=True)
+    last_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    last_result = models.ForeignKey(QuizResult, on_delete=models.SET_NULL, null=True, related_name='+')
+    retaking = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['quiz', 'student'], name='unique_quiz_score_summary')]
+
 
 class QuizAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
@@ -85,8 +155,173 @@ class QuizAttempt(models.Model):
     answer = models.CharField(max_length=255, null=True, blank=True)
     match_score = models.FloatField(default=0.0)
     is_correct = models.BooleanField()
+    # Правильный ответ на момент проверки: разбор не ищет его заново и не зависит от правок теста
+    correct_answer = models.ForeignKey(Answer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    correct_text = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'question'], name='attempt_user_question')]
+
+
+class QuizAttemptArchive(models.Model):
+    # Попытки старше горячего окна, month позволяет удалять историю помесячно
+    result = models.ForeignKey(QuizResult, on_delete=models.CASCADE, null=True, related_name='archived_attempts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer = models.CharField(max_length=255, null=True, blank=True)
+    match_score = models.FloatField(default=0.0)
+    is_correct = models.BooleanField()
+    correct_answer = models.ForeignKey(Answer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    correct_text = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    month = models.DateField()
+
+    class Meta:
+        indexes = [models.Index(fields=['month'], name='attempt_archive_month')]
+
+
+class PendingSubmission(models.Model):
+    # Буфер сдач на время экзамена: одна строка вместо результата, попыток и связей,
+    # в QuizResult и QuizAttempt пачками переносит drain_submissions
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='pending_submissions')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_submissions')
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    answers = models.JSONField(default=list)
+    number = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Ключ идемпотентности: повторная отправка той же попытки не создаёт вторую сдачу
+        constraints = [models.UniqueConstraint(fields=['quiz', 'student', 'number'], name='unique_pending_submission')]
+
+    @property
+    def completed_at(self):
+        return self.created_at
+
+
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='import_jobs')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    file = models.FileField(upload_to='imports/')
+    file_size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    restart_quiz = models.BooleanField(default=False)
+    incremental = models.BooleanField(default=False)
+    rows_processed = models.PositiveIntegerField(default=0)
+    report = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Воркер, взявший задачу, и его последний сигнал жизни: зависшими считаются только задачи без сигнала
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        constraints = [
+            # Два импорта в один тест одновременно не выполняются: это держит сама БД
+            models.UniqueConstraint(
+                fields=['quiz'], condition=models.Q(status='running'), name='one_running_import_per_quiz',
+            ),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class QuizStats(models.Model):
+    SCORE_BUCKETS = 101
+
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    results = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    @property
+    def mean_score(self):
+        return round(self.score_sum / self.results, 2) if self.results else 0
 
+    def percentile(self, p):
+        if not self.results:
+            return 0
+        threshold = self.results * p / 100
+        seen = 0
+        for score, count in enumerate(self.score_histogram):
+            seen += count
+            if seen >= threshold:
+                return score
+        return self.SCORE_BUCKETS - 1
 
+
+class QuestionStats(models.Model):
+    MATCH_BUCKETS = 10
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='question_stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    match_histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def correct_rate(self):
+        return round(self.correct / self.attempts * 100, 1) if self.attempts else 0
+
+
+
+class SearchDocument(models.Model):
+    COURSE = 'course'
+    MODULE = 'module'
+    QUESTION = 'question'
+    KIND_CHOICES = [
+        (COURSE, 'Курс'),
+        (MODULE, 'Модуль'),
+        (QUESTION, 'Вопрос'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='search_documents')
+    module = models.OneToOneField(Module, on_delete=models.CASCADE, null=True, related_name='search_document')
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, null=True, related_name='search_document')
+    title = models.CharField(max_length=500)
+    body = models.TextField(blank=True)
+    # Заполняется только на PostgreSQL, GIN-индекс создаётся в миграции
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course'], condition=models.Q(kind='course'), name='unique_course_search_document',
+            ),
+        ]
+
+    @property
+    def url(self):
+        if self.kind == self.QUESTION:
+            return reverse('take_quiz', args=[self.question.quiz_id])
+        return reverse('course_detail', args=[self.course_id])
+
+
+class SearchToken(models.Model):
+    # Инвертированный индекс для баз без полнотекстового поиска (SQLite в тестах)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='tokens')
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'document'], name='search_token_lookup')]
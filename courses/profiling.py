@@ -0,0 +1,261 @@
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from courses.utils import percentile
+
+_current = ContextVar('request_profile', default=None)
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    # Параметры приходят отдельно, остаётся схлопнуть списки IN и литералы
+    return _LITERAL.sub('?', _IN_LIST.sub('(...)', sql))
+
+
+@dataclass
+class RequestProfile:
+    view: str
+    method: str
+    path: str
+    started_at: float
+    status: int = 0
+    total_ms: float = 0.0
+    sql_ms: float = 0.0
+    queries: int = 0
+    fingerprints: Counter = field(default_factory=Counter)
+    templates: dict = field(default_factory=dict)
+
+    def record_query(self, sql, elapsed):
+        self.queries += 1
+        self.sql_ms += elapsed
+        self.fingerprints[fingerprint(sql)] += 1
+
+    def record_template(self, name, elapsed):
+        self.templates[name] = self.templates.get(name, 0) + elapsed
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'method': self.method,
+            'path': self.path,
+            'started_at': self.started_at,
+            'status': self.status,
+            'total_ms': round(self.total_ms, 3),
+            'sql_ms': round(self.sql_ms, 3),
+            'queries': self.queries,
+            'duplicates': {sql: count for sql, count in self.fingerprints.items() if count > 1},
+            'templates': {name: round(ms, 3) for name, ms in self.templates.items()},
+        }
+
+
+class ProfileBuffer:
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.added = 0
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            self.added += 1
+            return self.added
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+buffer = ProfileBuffer(settings.REQUEST_PROFILING_BUFFER)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_query_wrapper(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def install_query_wrappers():
+    # Обёртка стоит на каждом соединении любого алиаса (в том числе реплики) и любого потока:
+    # async-view ходят в БД из потоков sync_to_async, куда контекст с профилем копируется сам.
+    # Вне профилируемого запроса она ничего не считает
+    connection_created.connect(_install_query_wrapper, dispatch_uid='request-profiling')
+    for connection in connections.all(initialized_only=True):
+        _install_query_wrapper(connection)
+
+
+_template_timer_installed = False
+
+
+def install_template_timer():
+    # Сигнал template_rendered есть только в тестах, поэтому оборачиваем Template.render.
+    # Время включает вложенные include, extends считается в шаблоне-наследнике
+    global _template_timer_installed
+    if _template_timer_installed:
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return original_render(self, context)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            profile.record_template(self.origin.template_name or self.origin.name, (time.perf_counter() - started) * 1000)
+
+    Template.render = render
+    _template_timer_installed = True
+
+
+def snapshot_path(pid=None):
+    return Path(settings.REQUEST_PROFILING_DIR) / f'{pid or os.getpid()}.json'
+
+
+def write_snapshot():
+    # Буфер у каждого процесса свой: сбрасываем его в файл, команда и страница их объединяют
+    path = snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(buffer.snapshot(), ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def collect_profiles():
+    entries = buffer.snapshot()
+    directory = Path(settings.REQUEST_PROFILING_DIR)
+    if directory.is_dir():
+        for path in directory.glob('*.json'):
+            if path != snapshot_path():
+                try:
+                    entries.extend(json.loads(path.read_text(encoding='utf-8')))
+                except (OSError, ValueError):
+                    continue
+    return sorted(entries, key=lambda entry: entry['started_at'])
+
+
+def clear_profiles():
+    buffer.clear()
+    directory = Path(settings.REQUEST_PROFILING_DIR)
+    if directory.is_dir():
+        for path in directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def summarize(entries):
+    by_view = {}
+    for entry in entries:
+        by_view.setdefault(entry['view'], []).append(entry)
+
+    summary = []
+    for view, view_entries in by_view.items():
+        latencies = [entry['total_ms'] for entry in view_entries]
+        queries = [entry['queries'] for entry in view_entries]
+        duplicates = Counter()
+        templates = Counter()
+        for entry in view_entries:
+            duplicates.update(entry['duplicates'])
+            templates.update(entry['templates'])
+        summary.append({
+            'view': view,
+            'requests': len(view_entries),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'max_ms': round(max(latencies), 3),
+            'sql_ms_avg': round(statistics.mean(entry['sql_ms'] for entry in view_entries), 3),
+            'queries_avg': round(statistics.mean(queries), 1),
+            'queries_max': max(queries),
+            'duplicates': duplicates.most_common(5),
+            'templates': [(name, round(ms / len(view_entries), 3)) for name, ms in templates.most_common(5)],
+        })
+    return sorted(summary, key=lambda row: row['p95_ms'] * row['requests'], reverse=True)
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        self.flush_every = settings.REQUEST_PROFILING_FLUSH_EVERY
+        install_query_wrappers()
+        install_template_timer()
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self, request):
+        profile = RequestProfile(view='', method=request.method, path=request.path, started_at=time.time())
+        return profile, _current.set(profile), time.perf_counter()
+
+    def finish(self, request, response, profile, token, started):
+        _current.reset(token)
+        profile.total_ms = (time.perf_counter() - started) * 1000
+        if response is None:
+            return
+        profile.status = response.status_code
+        match = request.resolver_match
+        profile.view = (match.view_name if match else None) or 'unresolved'
+
+        added = buffer.add(profile.as_dict())
+        if self.flush_every and added % self.flush_every == 0:
+            write_snapshot()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile, token, started = self.start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(request, response, profile, token, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile, token, started = self.start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(request, response, profile, token, started)
+        return response
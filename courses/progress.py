@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from courses.models import CourseProgress, Enrollment, Progress
+
+
+def enrollments_with_progress(user):
+    rollup = CourseProgress.objects.filter(student=user, course=OuterRef('course')).values('completed_modules')[:1]
+    return (
+        Enrollment.objects
+        .filter(student=user)
+        .select_related('course__owner')
+        .annotate(
+            total_modules=F('course__module_count'),
+            completed_modules=Coalesce(Subquery(rollup, output_field=IntegerField()), 0),
+        )
+        .order_by('-enrolled_at')
+    )
+
+
+def completed_modules(modules, user):
+    if not user.is_authenticated:
+        return modules.none()
+    return modules.filter(completed=user)
+
+
+def complete_module(user, module):
+    with transaction.atomic():
+        _, created = Progress.objects.get_or_create(student=user, module=module)
+        if created:
+            rollup, rollup_created = CourseProgress.objects.get_or_create(
+                student=user,
+                course_id=module.course_id,
+                defaults={'completed_modules': 1},
+            )
+            if not rollup_created:
+                CourseProgress.objects.filter(pk=rollup.pk).update(completed_modules=F('completed_modules') + 1)
+    return created
+
+
+def refresh_course_progress(courses):
+    # Пересчёт сводки из Progress, например после удаления модулей
+    completed = (
+        Progress.objects
+        .filter(student=OuterRef('student'), module__course=OuterRef('course'))
+        .order_by().values('student').annotate(total=Count('pk')).values('total')
+    )
+    return CourseProgress.objects.filter(course__in=courses).update(
+        completed_modules=Coalesce(Subquery(completed, output_field=IntegerField()), 0)
+    )
+
+
+def backfill_course_progress(batch_size=1000):
+    rows = (
+        Progress.objects
+        .values('student_id', course_id=F('module__course_id'))
+        .annotate(total=Count('pk'))
+        .order_by()
+    )
+    with transaction.atomic():
+        CourseProgress.objects.all().delete()
+        batch = []
+        created = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(CourseProgress(
+                student_id=row['student_id'],
+                course_id=row['course_id'],
+                completed_modules=row['total'],
+            ))
+            if len(batch) >= batch_size:
+                created += len(CourseProgress.objects.bulk_create(batch))
+                batch = []
+        created += len(CourseProgress.objects.bulk_create(batch))
+    return created
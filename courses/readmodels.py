@@ -0,0 +1,22 @@
+from django.db.models import Exists, OuterRef, Prefetch
+from courses.models import Answer, Question, Quiz
+
+
+def questions_with_answers():
+    has_correct = Exists(Answer.objects.filter(question=OuterRef('pk'), is_correct=True))
+    return (
+        Question.objects.order_by('id')
+        .annotate(has_correct=has_correct)
+        .prefetch_related(Prefetch('answers', queryset=Answer.objects.order_by('pk')))
+    )
+
+
+def quiz_editor_queryset():
+    # Тест, вопросы с флагом правильного ответа и ответы — три запроса при любом числе вопросов
+    return Quiz.objects.select_related('course').prefetch_related(
+        Prefetch('questions', queryset=questions_with_answers(), to_attr='question_tree')
+    )
+
+
+def quiz_form_questions(quiz):
+    return quiz.questions.order_by('id').only('id', 'quiz_id', 'text')
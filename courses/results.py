@@ -0,0 +1,91 @@
+from django.db.models import Max
+from courses.models import PendingSubmission, QuizResult, QuizScoreSummary
+
+
+def is_pending(result):
+    return isinstance(result, PendingSubmission)
+
+
+def next_attempt_number(quiz, user):
+    last = QuizResult.objects.filter(quiz=quiz, student=user).aggregate(last=Max('number'))['last']
+    return (last or 0) + 1
+
+
+def get_summary(quiz, user):
+    return QuizScoreSummary.objects.select_related('last_result').filter(quiz=quiz, student=user).first()
+
+
+async def aget_summary(quiz, user):
+    return await QuizScoreSummary.objects.select_related('last_result').filter(quiz=quiz, student=user).afirst()
+
+
+def current_result(summary):
+    # Пока студент не начал тест заново, текущая сдача — последняя попытка
+    if summary is None or summary.retaking or summary.last_result is None:
+        return None
+    result = summary.last_result
+    result.summary = summary
+    return result
+
+
+def record_scores(results):
+    # Сводка лучшего и последнего результата обновляется в той же транзакции, что и результаты
+    summaries = {
+        (summary.quiz_id, summary.student_id): summary
+        for summary in QuizScoreSummary.objects.select_for_update().filter(
+            quiz_id__in={result.quiz_id for result in results},
+            student_id__in={result.student_id for result in results},
+        ).order_by('pk')
+    }
+    created = []
+    for result in sorted(results, key=lambda result: result.number):
+        summary = summaries.get((result.quiz_id, result.student_id))
+        if summary is None:
+            summary = summaries[result.quiz_id, result.student_id] = QuizScoreSummary(
+                quiz_id=result.quiz_id, student_id=result.student_id,
+            )
+            created.append(summary)
+        summary.attempts += 1
+        summary.last_score = result.score
+        summary.last_result = result
+        if summary.best_score is None or result.score > summary.best_score:
+            summary.best_score = result.score
+            summary.best_number = result.number
+        summary.retaking = False
+        result.summary = summary
+    updated = [summary for summary in summaries.values() if summary.pk]
+    QuizScoreSummary.objects.bulk_create(created)
+    QuizScoreSummary.objects.bulk_update(
+        updated,
+        ['attempts', 'best_score', 'best_number', 'last_score', 'last_result', 'retaking'],
+    )
+
+
+def open_retake(quiz, user):
+    # Прежние попытки остаются в истории, следующая сдача получит новый номер
+    QuizScoreSummary.objects.filter(quiz=quiz, student=user).update(retaking=True)
+
+
+def _other_session(result, number):
+    # Прежняя попытка из истории; сводка у всех попыток общая
+    if number is None or number == result.number or is_pending(result):
+        return None
+    return QuizResult.objects.filter(quiz_id=result.quiz_id, student_id=result.student_id, number=number)
+
+
+def select_session(result, number):
+    sessions = _other_session(result, number)
+    other = sessions.first() if sessions is not None else None
+    if other is None:
+        return result
+    other.summary = result.summary
+    return other
+
+
+async def aselect_session(result, number):
+    sessions = _other_session(result, number)
+    other = await sessions.afirst() if sessions is not None else None
+    if other is None:
+        return result
+    other.summary = result.summary
+    return other
@@ -0,0 +1,64 @@
+from contextvars import ContextVar
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_reads(view):
+    # Помечает view, которому можно читать с реплики
+    view.replica_reads = True
+    return view
+
+
+def read_from_primary():
+    # Остаток запроса читает с основной базы, например когда он заполняет общий кэш:
+    # отстающая реплика не должна попасть в кэш под свежей версией
+    _use_replica.set(False)
+
+
+def allows_replica_reads(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'replica_reads', False) or getattr(view_class, 'replica_reads', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.REPLICA_DATABASE and _use_replica.get():
+            return settings.REPLICA_DATABASE
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # После записи чтения в этом же запросе идут на основную базу
+        _use_replica.set(False)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            settings.REPLICA_DATABASE
+            and request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and allows_replica_reads(view_func)
+        ):
+            _use_replica.set(True)
+            request.replica_reads = True
+
+    def process_response(self, request, response):
+        if getattr(request, 'replica_reads', False):
+            _use_replica.set(False)
+        # Реплика отстаёт: после записи пользователь какое-то время читает с основной базы
+        if settings.REPLICA_DATABASE and request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
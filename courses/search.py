@@ -0,0 +1,181 @@
+import re
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum, prefetch_related_objects
+from rapidfuzz import fuzz, process, utils
+from courses.models import Course, Module, Question, SearchDocument, SearchToken
+
+SEARCH_CONFIG = 'russian'
+SEARCH_CANDIDATES = 200
+SEARCH_BATCH_SIZE = 1000
+TITLE_WEIGHT = 2
+BODY_WEIGHT = 1
+TOKEN_MAX_LENGTH = SearchToken._meta.get_field('token').max_length
+FUZZY_CUTOFF = 75
+
+_WORD = re.compile(r'\w+')
+
+# Оператор % из pg_trgm нужен только для заголовков документов
+SearchDocument._meta.get_field('title').register_lookup(TrigramSimilar)
+
+
+def tokenize(text):
+    return [token[:TOKEN_MAX_LENGTH] for token in _WORD.findall(text.lower()) if len(token) > 1]
+
+
+def course_document(course):
+    return SearchDocument(kind=SearchDocument.COURSE, course_id=course.pk, title=course.title, body=course.description)
+
+
+def module_document(module):
+    return SearchDocument(
+        kind=SearchDocument.MODULE, course_id=module.course_id, module_id=module.pk,
+        title=module.title, body=module.description,
+    )
+
+
+def question_document(question, course_id):
+    return SearchDocument(
+        kind=SearchDocument.QUESTION, course_id=course_id, question_id=question.pk,
+        title=question.text, body=question.description,
+    )
+
+
+def _document_tokens(document):
+    weights = {}
+    for token in tokenize(document.body):
+        weights[token] = BODY_WEIGHT
+    for token in tokenize(document.title):
+        weights[token] = TITLE_WEIGHT
+    return [SearchToken(document_id=document.pk, token=token, weight=weight) for token, weight in weights.items()]
+
+
+def save_documents(documents, stale=None):
+    # Документ проще пересоздать, чем сравнивать: stale выбирает прежние версии
+    if not documents and stale is None:
+        return 0
+    with transaction.atomic():
+        if stale is not None:
+            SearchDocument.objects.filter(stale).delete()
+        created = SearchDocument.objects.bulk_create(documents, batch_size=SEARCH_BATCH_SIZE)
+        if connection.vendor == 'postgresql':
+            SearchDocument.objects.filter(pk__in=[document.pk for document in created]).update(
+                search_vector=(
+                    SearchVector('title', weight='A', config=SEARCH_CONFIG)
+                    + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+                ),
+            )
+        else:
+            SearchToken.objects.bulk_create(
+                [token for document in created for token in _document_tokens(document)],
+                batch_size=SEARCH_BATCH_SIZE,
+            )
+    return len(created)
+
+
+def index_course(course):
+    save_documents([course_document(course)], Q(kind=SearchDocument.COURSE, course_id=course.pk))
+
+
+def index_module(module):
+    save_documents([module_document(module)], Q(module_id=module.pk))
+
+
+def index_question(question):
+    save_documents([question_document(question, question.quiz.course_id)], Q(question_id=question.pk))
+
+
+def index_quiz_questions(quiz):
+    questions = list(quiz.questions.only('id', 'text', 'description'))
+    return save_documents(
+        [question_document(question, quiz.course_id) for question in questions],
+        Q(question__quiz=quiz),
+    )
+
+
+def _index_in_batches(queryset, build, batch_size):
+    total = 0
+    batch = []
+    for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(build(obj))
+        if len(batch) >= batch_size:
+            total += save_documents(batch)
+            batch = []
+    return total + save_documents(batch)
+
+
+def rebuild_search_index(batch_size=SEARCH_BATCH_SIZE):
+    SearchDocument.objects.all().delete()
+    questions = Question.objects.only('id', 'text', 'description').annotate(course_id=F('quiz__course_id'))
+    return (
+        _index_in_batches(Course.objects.only('id', 'title', 'description'), course_document, batch_size)
+        + _index_in_batches(Module.objects.only('id', 'course_id', 'title', 'description'), module_document, batch_size)
+        + _index_in_batches(questions, lambda question: question_document(question, question.course_id), batch_size)
+    )
+
+
+def _postgres_candidates(query, limit, kinds):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    indexed = SearchDocument.objects.filter(kind__in=kinds)
+    documents = list(
+        indexed.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank')[:limit]
+    )
+    if len(documents) < limit:
+        # Опечатки: добираем похожие заголовки по триграммам
+        documents += list(
+            indexed.filter(title__trigram_similar=query)
+            .exclude(pk__in=[document.pk for document in documents])[:limit - len(documents)]
+        )
+    return documents
+
+
+def _matching_tokens(term):
+    # Кандидаты на опечатку берём среди слов с тем же началом, их немного
+    vocabulary = (
+        SearchToken.objects.filter(token__startswith=term[:2])
+        .values_list('token', flat=True).distinct()[:5000]
+    )
+    matches = process.extract(term, list(vocabulary), scorer=fuzz.ratio, score_cutoff=FUZZY_CUTOFF, limit=10)
+    return {term} | {token for token, _, _ in matches}
+
+
+def _token_candidates(query, limit, kinds):
+    tokens = set()
+    for term in set(tokenize(query)):
+        tokens |= _matching_tokens(term)
+    scores = (
+        SearchToken.objects.filter(token__in=tokens, document__kind__in=kinds)
+        .values('document_id')
+        .annotate(matched=Count('token'), weight=Sum('weight'))
+        .order_by('-matched', '-weight', 'document_id')[:limit]
+    )
+    return list(SearchDocument.objects.filter(pk__in=[row['document_id'] for row in scores]))
+
+
+def search(query, limit=20, candidates=SEARCH_CANDIDATES, kinds=None):
+    # kinds ограничивает типы документов: анонимам тексты вопросов не показываем
+    kinds = kinds or [kind for kind, _ in SearchDocument.KIND_CHOICES]
+    query = ' '.join(query.split())[:200]
+    if not tokenize(query):
+        return []
+    if connection.vendor == 'postgresql':
+        documents = _postgres_candidates(query, candidates, kinds)
+    else:
+        documents = _token_candidates(query, candidates, kinds)
+
+    # Индекс даёт кандидатов, порядок уточняем нечётким сравнением с запросом
+    processed = utils.default_process(query)
+    for document in documents:
+        document.score = round(
+            0.7 * fuzz.WRatio(processed, utils.default_process(document.title))
+            + 0.3 * fuzz.partial_token_set_ratio(processed, utils.default_process(document.body[:500])),
+            1,
+        )
+    documents.sort(key=lambda document: document.score, reverse=True)
+    top = documents[:limit]
+    # Для ссылок и подписей нужны курс и вопрос, подгружаем их пачкой
+    prefetch_related_objects(top, 'course', 'question')
+    return top
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from courses.cache import invalidate_course
+from courses.catalogue import invalidate_catalogue
+from courses.counters import add_to_counter
+from courses.grading import invalidate_answer_key
+from courses.models import Answer, Course, Module, Question, Quiz
+from courses.search import index_course, index_module, index_question
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, **kwargs):
+    # Версия теста заодно служит ETag для API, название тоже в неё входит
+    invalidate_answer_key(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    if created:
+        add_to_counter(Quiz, instance.quiz_id, 'question_count', 1)
+    invalidate_answer_key(instance.quiz_id)
+    index_question(instance)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    add_to_counter(Quiz, instance.quiz_id, 'question_count', -1)
+    invalidate_answer_key(instance.quiz_id)
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, **kwargs):
+    invalidate_answer_key(instance.question.quiz_id)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    # При каскадном удалении вопроса ответы удаляются раньше него, вопрос ещё на месте
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None:
+        invalidate_answer_key(quiz_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_catalogue()
+    invalidate_course(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    index_course(instance)
+
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, **kwargs):
+    index_module(instance)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def course_content_changed(sender, instance, **kwargs):
+    # Модули и тесты выводятся на странице курса
+    invalidate_course(instance.course_id)
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from courses.analytics import record_submissions
+from courses.grading import pack_answers, save_attempt_rows, save_submission, unpack_answers
+from courses.models import PendingSubmission, Quiz, QuizResult
+from courses.results import aget_summary, current_result, get_summary, next_attempt_number, record_scores
+
+DRAIN_BATCH_SIZE = 500
+
+
+def buffer_submission(quiz, user, graded):
+    # Одна вставка на сдачу; повтор той же сдачи упирается в unique_pending_submission
+    # и, как и save_submission, поднимает IntegrityError
+    return PendingSubmission.objects.create(
+        quiz=quiz, student=user, score=graded.score, answers=pack_answers(graded),
+        number=next_attempt_number(quiz, user),
+    )
+
+
+def store_submission(quiz, user, graded):
+    if settings.QUIZ_SUBMISSION_BUFFER:
+        return buffer_submission(quiz, user, graded)
+    return save_submission(quiz, user, graded)
+
+
+def find_submission(quiz, user):
+    # Сдача из буфера важнее сводки: она ещё не попала в результаты
+    if settings.QUIZ_SUBMISSION_BUFFER:
+        pending = PendingSubmission.objects.filter(quiz=quiz, student=user).order_by('-number').first()
+        if pending:
+            return pending
+    return current_result(get_summary(quiz, user))
+
+
+async def afind_submission(quiz, user):
+    if settings.QUIZ_SUBMISSION_BUFFER:
+        pending = await PendingSubmission.objects.filter(quiz=quiz, student=user).order_by('-number').afirst()
+        if pending:
+            return pending
+    return current_result(await aget_summary(quiz, user))
+
+
+def drain_submissions(batch_size=DRAIN_BATCH_SIZE):
+    with transaction.atomic():
+        # skip_locked: несколько воркеров разбирают буфер, не дожидаясь друг друга
+        batch = list(PendingSubmission.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size])
+        if not batch:
+            return 0
+
+        taken = set(
+            QuizResult.objects.filter(
+                quiz_id__in={pending.quiz_id for pending in batch},
+                student_id__in={pending.student_id for pending in batch},
+            ).values_list('quiz_id', 'student_id', 'number')
+        )
+        # Попытка, уже попавшая в результаты, повторно не учитывается
+        fresh = [
+            pending for pending in batch
+            if (pending.quiz_id, pending.student_id, pending.number) not in taken
+        ]
+        graded = [unpack_answers(pending.answers) for pending in fresh]
+
+        results = QuizResult.objects.bulk_create(
+            [
+                QuizResult(
+                    quiz_id=pending.quiz_id, student_id=pending.student_id, score=pending.score,
+                    answers=pending.answers, number=pending.number,
+                )
+                for pending in fresh
+            ],
+            batch_size=batch_size,
+        )
+        record_scores(results)
+        if settings.QUIZ_ATTEMPT_ROWS:
+            save_attempt_rows(
+                [(result, submission, pending.created_at) for result, submission, pending in zip(results, graded, fresh)],
+                batch_size=batch_size,
+            )
+
+        if settings.QUIZ_ANALYTICS_LIVE:
+            by_quiz = defaultdict(list)
+            for pending, submission in zip(fresh, graded):
+                by_quiz[pending.quiz_id].append(submission)
+            quizzes = Quiz.objects.in_bulk(list(by_quiz))
+            for quiz_id in sorted(by_quiz):
+                record_submissions(quizzes[quiz_id], by_quiz[quiz_id])
+
+        PendingSubmission.objects.filter(pk__in=[pending.pk for pending in batch]).delete()
+    return len(batch)
@@ -1,7 +1,8 @@
 from django import template
+from courses.progress import completed_modules
 
 register = template.Library()
 
 @register.filter
 def completed_for_user(modules, user):
-    return [m for m in modules.all() if user in m.completed.all()]
+    return list(completed_modules(modules.all(), user))
@@ -1,6 +1,62 @@
-from django.test import TestCase
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from xml.etree import ElementTree
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import include, path, reverse
+from django.utils import timezone
+from courses.analytics import compact_quiz_stats
+from courses.catalogue import build_catalogue_page, get_catalogue_page
+from courses.counters import reconcile_counters
+from courses.benchmarks import measure_views, quiz_csv, view_scenarios
+from courses.datasets import DatasetSpec, generate_dataset
+from courses.enrollment import import_roster
+from courses.grading import ANSWER_MAX_LENGTH, build_answer_key, get_answer_key, grade_submission, save_submission
+from courses.importing import import_quiz_questions
+from courses.jobs import STALE_AFTER, claim_next_job, requeue_stale_jobs, run_import_job, run_pending_jobs, worker_name
+from courses.models import Answer, ImportJob, PendingSubmission, QuestionStats, QuizAttempt, QuizAttemptArchive, QuizScoreSummary, QuizStats, Course, CourseProgress, Enrollment, Module, Question, Quiz, QuizResult
+from courses import profiling
+from courses.search import rebuild_search_index, search
+from courses.submissions import drain_submissions
+from courses import async_views
+from courses.routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from courses.progress import backfill_course_progress, complete_module, enrollments_with_progress
 from courses.utils import get_match_score
 
+class ReplicaMirrorMixin:
+    # Страницы с replica_reads читают с реплики, если она настроена. В тестах реплика — зеркало default,
+    # но отдельное соединение не видит данных незакоммиченной тестовой транзакции, поэтому на время
+    # класса алиас реплики получает соединение default: маршрутизация та же, данные общие
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if settings.REPLICA_DATABASE in connections:
+            cls.replica_connection = connections[settings.REPLICA_DATABASE]
+            connections[settings.REPLICA_DATABASE] = connections[DEFAULT_DB_ALIAS]
+
+    @classmethod
+    def tearDownClass(cls):
+        if settings.REPLICA_DATABASE in connections:
+            connections[settings.REPLICA_DATABASE] = cls.replica_connection
+        super().tearDownClass()
+
+
 class FuzzyMatchingTests(TestCase):
     def test_exact_match(self):
         self.assertAlmostEqual(get_match_score("Python", "Python"), 1.0)
@@ -11,3 +67,1089 @@ class FuzzyMatchingTests(TestCase):
     def test_low_match(self):
         self.assertTrue(get_match_score("Java", "Python") < 0.5)
 
+
+class DashboardProgressTests(ReplicaMirrorMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.student = User.objects.create_user('student', password='pass')
+
+    def enroll_in_course(self, modules=3, completed=1):
+        course = Course.objects.create(title='Курс', description='Описание', owner=self.owner)
+        for i in range(modules):
+            module = Module.objects.create(course=course, title=f'Модуль {i}', description='')
+            if i < completed:
+                complete_module(self.student, module)
+        enrollment = Enrollment.objects.create(student=self.student, course=course)
+        reconcile_counters()
+        return enrollment
+
+    def dashboard_query_count(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_progress_counts(self):
+        self.enroll_in_course(modules=4, completed=3)
+        enrollment = enrollments_with_progress(self.student).get()
+        self.assertEqual((enrollment.completed_modules, enrollment.total_modules), (3, 4))
+
+    def test_other_students_progress_not_counted(self):
+        enrollment = self.enroll_in_course(modules=2, completed=0)
+        other = User.objects.create_user('other')
+        complete_module(other, enrollment.course.modules.first())
+        self.assertEqual(enrollments_with_progress(self.student).get().completed_modules, 0)
+
+    def test_dashboard_query_count_is_constant(self):
+        self.enroll_in_course()
+        single = self.dashboard_query_count()
+        for _ in range(5):
+            self.enroll_in_course(modules=6, completed=2)
+        self.assertEqual(self.dashboard_query_count(), single)
+
+
+class CompletionStoreTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Курс', description='', owner=self.owner)
+        self.modules = [
+            Module.objects.create(course=self.course, title=f'Модуль {i}', description='')
+            for i in range(3)
+        ]
+        reconcile_counters()
+
+    def rollup(self):
+        return CourseProgress.objects.get(student=self.student, course=self.course).completed_modules
+
+    def test_complete_module_updates_rollup_once(self):
+        self.assertTrue(complete_module(self.student, self.modules[0]))
+        self.assertFalse(complete_module(self.student, self.modules[0]))
+        complete_module(self.student, self.modules[1])
+        self.assertEqual(self.rollup(), 2)
+        self.assertTrue(self.modules[0].is_completed_by(self.student))
+
+    def test_mark_module_complete_view_feeds_rollup(self):
+        self.client.force_login(self.student)
+        self.client.post(reverse('mark_module_complete', args=[self.modules[2].pk]))
+        self.assertEqual(self.rollup(), 1)
+        self.assertTrue(self.modules[2].is_completed_by(self.student))
+
+    def test_deleting_module_refreshes_rollup(self):
+        for module in self.modules:
+            complete_module(self.student, module)
+        self.client.force_login(self.owner)
+        self.client.post(reverse('course_detail', args=[self.course.pk]), {'delete_module_id': self.modules[0].pk})
+        self.assertEqual(self.rollup(), 2)
+
+    def test_backfill_rebuilds_rollup(self):
+        complete_module(self.student, self.modules[0])
+        CourseProgress.objects.all().delete()
+        self.assertEqual(backfill_course_progress(), 1)
+        self.assertEqual(self.rollup(), 1)
+
+
+class QuizTestCase(ReplicaMirrorMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.student = User.objects.create_user('student', password='pass')
+        course = Course.objects.create(title='Курс', description='', owner=self.owner)
+        self.quiz = Quiz.objects.create(course=course, title='Тест')
+
+    def add_question(self, text, *correct, wrong=()):
+        question = Question.objects.create(quiz=self.quiz, text=text)
+        for answer in correct:
+            Answer.objects.create(question=question, text=answer, is_correct=True)
+        for answer in wrong:
+            Answer.objects.create(question=question, text=answer)
+        return question
+
+
+class GradingTests(QuizTestCase):
+    def submit(self, answers):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('take_quiz', args=[self.quiz.pk]),
+                {f'q{question.pk}': text for question, text in answers.items()},
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_any_accepted_answer_counts(self):
+        question = self.add_question('Язык?', 'Python', 'Питон', wrong=['Java'])
+        key = build_answer_key(self.quiz)
+        self.assertTrue(grade_submission(key, {question.pk: ' питон '}).answers[0].is_correct)
+        self.assertFalse(grade_submission(key, {question.pk: 'Java'}).answers[0].is_correct)
+
+    def test_question_without_correct_answer_is_wrong(self):
+        question = self.add_question('Без ответа', wrong=['что-то'])
+        graded = grade_submission(build_answer_key(self.quiz), {question.pk: 'что-то'})
+        self.assertEqual((graded.correct_count, graded.score), (0, 0))
+
+    def test_submission_is_saved_with_attempts(self):
+        first = self.add_question('Столица Франции?', 'Париж')
+        second = self.add_question('2 + 2?', '4')
+        self.submit({first: 'Париж', second: '5'})
+        result = QuizResult.objects.get(quiz=self.quiz, student=self.student)
+        self.assertEqual(result.score, 50)
+        self.assertEqual(
+            sorted(result.attempts.values_list('question_id', 'is_correct')),
+            [(first.pk, True), (second.pk, False)],
+        )
+
+    def grading_query_count(self, answers, student):
+        submitted = {question.pk: text for question, text in answers.items()}
+        with CaptureQueriesContext(connection) as ctx:
+            save_submission(self.quiz, student, grade_submission(build_answer_key(self.quiz), submitted))
+        return len(ctx.captured_queries)
+
+    @override_settings(QUIZ_ANALYTICS_LIVE=False)
+    def test_grading_query_count_is_constant(self):
+        small = {self.add_question(f'Вопрос {i}', f'Ответ {i}'): f'Ответ {i}' for i in range(3)}
+        small_queries = self.grading_query_count(small, self.student)
+        large = {self.add_question(f'Ещё {i}', f'Ответ {i}'): 'нет' for i in range(100)}
+        other = User.objects.create_user('other')
+        self.assertEqual(self.grading_query_count({**small, **large}, other), small_queries)
+
+
+class AnswerKeyCacheTests(QuizTestCase):
+    def test_key_is_served_from_cache(self):
+        self.add_question('Язык?', 'Python')
+        get_answer_key(self.quiz)
+        with self.assertNumQueries(0):
+            key = get_answer_key(self.quiz)
+        self.assertEqual(len(key.question_ids), 1)
+
+    def test_answer_save_invalidates_key(self):
+        question = self.add_question('Язык?', 'Python')
+        self.assertEqual(get_answer_key(self.quiz).references[question.pk], ('python',))
+        answer = question.answers.get()
+        answer.text = 'Rust'
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.save()
+        self.assertEqual(get_answer_key(self.quiz).references[question.pk], ('rust',))
+
+    def test_answer_and_question_delete_invalidate_key(self):
+        question = self.add_question('Язык?', 'Python', 'Питон')
+        self.assertTrue(grade_submission(get_answer_key(self.quiz), {question.pk: 'Питон'}).answers[0].is_correct)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.answers.get(text='Питон').delete()
+        self.assertFalse(grade_submission(get_answer_key(self.quiz), {question.pk: 'Питон'}).answers[0].is_correct)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        self.assertEqual(get_answer_key(self.quiz).question_ids, ())
+
+
+def csv_upload(*rows, header='question,answer,is_correct'):
+    content = '\ufeff' + '\r\n'.join((header,) + rows) + '\r\n'
+    return SimpleUploadedFile('questions.csv', content.encode('utf-8'), content_type='text/csv')
+
+
+class QuizImportTests(QuizTestCase):
+    def test_report_counts_rows(self):
+        report = import_quiz_questions(self.quiz, csv_upload(
+            '"Что такое Python?", "Язык программирования", True',
+            '"Что такое Python?", "Птица", False',
+            '"Что такое Python?", "Птица", False',
+            '"Без ответа", "Нет", False',
+            ',"Пустой вопрос",True',
+        ))
+        self.assertEqual(
+            (report.rows_read, report.rows_skipped, report.duplicates),
+            (5, 1, 1),
+        )
+        self.assertEqual((report.questions_created, report.answers_created), (2, 3))
+        self.assertEqual(report.questions_without_correct, 1)
+        correct = Answer.objects.get(question__quiz=self.quiz, is_correct=True)
+        self.assertEqual(correct.text, 'Язык программирования')
+
+    def test_replaces_existing_questions(self):
+        self.add_question('Старый вопрос', 'ответ')
+        import_quiz_questions(self.quiz, csv_upload('Новый,да,true'))
+        self.assertEqual(list(self.quiz.questions.values_list('text', flat=True)), ['Новый'])
+
+    def test_rows_of_one_question_are_grouped_across_batches(self):
+        rows = [f'Вопрос {i % 3},Ответ {i},{"true" if i < 3 else "false"}' for i in range(10)]
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_quiz_questions(self.quiz, csv_upload(*rows), batch_size=4)
+        self.assertEqual((report.questions_created, report.answers_created), (3, 10))
+        self.assertEqual(self.quiz.questions.count(), 3)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertLessEqual(len(inserts), 6)
+
+    def test_incremental_import_of_unchanged_file_writes_nothing(self):
+        rows = ('Столица Франции?,Париж,true', 'Столица Франции?,Берлин,false', '2 + 2?,4,true')
+        import_quiz_questions(self.quiz, csv_upload(*rows))
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_quiz_questions(self.quiz, csv_upload(*rows), incremental=True)
+        writes = [q for q in ctx.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertFalse(report.changed)
+
+    def test_incremental_import_applies_diff_and_keeps_history(self):
+        import_quiz_questions(self.quiz, csv_upload(
+            'Столица Франции?,Париж,true',
+            'Столица Франции?,Берлин,false',
+            'Устаревший вопрос,ответ,true',
+        ))
+        kept = self.quiz.questions.get(text='Столица Франции?')
+        paris = kept.answers.get(text='Париж')
+        QuizAttempt.objects.create(user=self.student, question=kept, answer='Париж', is_correct=True)
+
+        report = import_quiz_questions(self.quiz, csv_upload(
+            'столица  франции?,Париж,true',
+            'столица  франции?,Лион,false',
+            'Новый вопрос,да,true',
+        ), incremental=True)
+
+        self.assertEqual(
+            (report.questions_created, report.questions_updated, report.questions_deleted),
+            (1, 1, 1),
+        )
+        self.assertEqual((report.answers_created, report.answers_deleted), (2, 1))
+        kept.refresh_from_db()
+        self.assertEqual(kept.text, 'столица  франции?')
+        self.assertTrue(Answer.objects.filter(pk=paris.pk, is_correct=True).exists())
+        self.assertEqual(QuizAttempt.objects.filter(question=kept).count(), 1)
+        self.assertFalse(self.quiz.questions.filter(text='Устаревший вопрос').exists())
+
+    def test_incremental_import_updates_correct_flag(self):
+        import_quiz_questions(self.quiz, csv_upload('Вопрос,Ответ,false'))
+        report = import_quiz_questions(self.quiz, csv_upload('Вопрос,Ответ,true'), incremental=True)
+        self.assertEqual(report.answers_updated, 1)
+        self.assertTrue(Answer.objects.get(question__quiz=self.quiz).is_correct)
+
+    def test_import_view_reports_summary(self):
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('import_questions', args=[self.quiz.pk]),
+            {'file': csv_upload('Вопрос,Ответ,true')},
+            follow=True,
+        )
+        self.assertContains(response, 'вопросов: 1, ответов: 1')
+
+
+@override_settings(QUIZ_IMPORT_ASYNC_THRESHOLD=0, MEDIA_ROOT=tempfile.mkdtemp())
+class ImportJobTests(QuizTestCase):
+    def upload(self, url_name, **extra):
+        self.client.force_login(self.owner)
+        return self.client.post(reverse(url_name, args=[self.quiz.pk]), {'file': csv_upload('Вопрос,Ответ,true')}, **extra)
+
+    def status(self, job):
+        return self.client.get(reverse('import_job_status', args=[job.pk])).json()
+
+    def test_large_upload_is_queued(self):
+        response = self.upload('import_questions')
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import_job', args=[job.pk]))
+        self.assertEqual(self.status(job)['status'], ImportJob.PENDING)
+        self.assertFalse(self.quiz.questions.exists())
+
+    def test_worker_runs_queued_import(self):
+        self.upload('import_questions')
+        run_import_job(claim_next_job())
+        self.assertIsNone(claim_next_job())
+        job = ImportJob.objects.get()
+        status = self.status(job)
+        self.assertEqual(status['status'], ImportJob.DONE)
+        self.assertEqual(status['report']['questions_created'], 1)
+        self.assertEqual(status['next_url'], reverse('edit_quiz', args=[self.quiz.pk]))
+        self.assertEqual(self.quiz.questions.count(), 1)
+
+    def test_auto_import_job_opens_retake_for_owner(self):
+        save_submission(self.quiz, self.owner, grade_submission(get_answer_key(self.quiz), {}))
+        self.upload('auto_import_and_start_quiz')
+        run_import_job(claim_next_job())
+        self.assertTrue(QuizScoreSummary.objects.get(quiz=self.quiz, student=self.owner).retaking)
+        self.assertEqual(QuizResult.objects.filter(quiz=self.quiz).count(), 1)
+        self.assertEqual(self.status(ImportJob.objects.get())['next_url'], reverse('take_quiz', args=[self.quiz.pk]))
+
+    def test_second_job_for_the_same_quiz_waits(self):
+        self.upload('import_questions')
+        self.upload('import_questions')
+        first, second = ImportJob.objects.order_by('pk')
+        self.assertEqual(claim_next_job('w1').pk, first.pk)
+        self.assertIsNone(claim_next_job('w2'))
+        # Гонку мимо фильтра кандидатов останавливает ограничение в БД
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ImportJob.objects.filter(pk=second.pk).update(status=ImportJob.RUNNING)
+
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        self.upload('import_questions')
+        job = claim_next_job('w1')
+        requeue_stale_jobs(STALE_AFTER)
+        self.assertEqual(ImportJob.objects.get().status, ImportJob.RUNNING)
+        ImportJob.objects.update(heartbeat_at=timezone.now() - STALE_AFTER - timedelta(minutes=1))
+        self.assertEqual(requeue_stale_jobs(STALE_AFTER), 1)
+        self.assertEqual(claim_next_job('w2').pk, job.pk)
+        self.assertEqual(ImportJob.objects.get().worker, 'w2')
+
+    def test_running_worker_takes_over_job_with_expired_heartbeat(self):
+        self.upload('import_questions')
+        job = claim_next_job('w1')
+        ImportJob.objects.update(heartbeat_at=timezone.now() - STALE_AFTER - timedelta(minutes=1))
+        # Сам импорт в потоке не запускаем: у потока своё соединение, а тестовая транзакция не закоммичена
+        with mock.patch('courses.jobs._run_in_thread') as run:
+            self.assertEqual(run_pending_jobs(workers=1), 1)
+        self.assertEqual(run.call_args.args[0].pk, job.pk)
+        self.assertEqual(ImportJob.objects.get().worker, worker_name())
+
+    def test_status_is_private_to_owner(self):
+        self.upload('import_questions')
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('import_job_status', args=[ImportJob.objects.get().pk])).status_code, 404)
+
+
+@override_settings(QUIZ_ANALYTICS_LIVE=True)
+class QuizAnalyticsTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+
+    def take(self, username, answers):
+        student = User.objects.create_user(username)
+        key = get_answer_key(self.quiz)
+        save_submission(self.quiz, student, grade_submission(key, {q.pk: a for q, a in answers.items()}))
+
+    def test_grading_updates_aggregates(self):
+        self.take('a', {self.capital: 'Париж', self.sum: '4'})
+        self.take('b', {self.capital: 'Лондон', self.sum: '4'})
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.results, stats.mean_score), (2, 75))
+        self.assertEqual((stats.percentile(25), stats.percentile(100)), (50, 100))
+        capital = QuestionStats.objects.get(question=self.capital)
+        self.assertEqual((capital.attempts, capital.correct, capital.correct_rate), (2, 1, 50))
+        self.assertEqual(sum(capital.match_histogram), 2)
+        self.assertEqual(capital.match_histogram[-1], 1)
+
+    def test_compaction_matches_live_aggregates(self):
+        self.take('a', {self.capital: 'Париж', self.sum: '5'})
+        self.take('b', {self.capital: 'Париж', self.sum: '4'})
+        live = QuestionStats.objects.get(question=self.sum)
+        live_quiz = QuizStats.objects.get(quiz=self.quiz)
+        QuizStats.objects.all().delete()
+        QuestionStats.objects.all().delete()
+
+        compact_quiz_stats(self.quiz)
+
+        compacted = QuestionStats.objects.get(question=self.sum)
+        self.assertEqual(
+            (compacted.attempts, compacted.correct, compacted.match_histogram),
+            (live.attempts, live.correct, live.match_histogram),
+        )
+        compacted_quiz = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual(compacted_quiz.score_histogram, live_quiz.score_histogram)
+        self.assertEqual(compacted_quiz.score_sum, live_quiz.score_sum)
+
+    @override_settings(QUIZ_ANALYTICS_LIVE=False)
+    def test_grading_leaves_aggregates_to_compaction(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.take('a', {self.capital: 'Париж', self.sum: '4'})
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_quizstats' in q['sql']])
+        compact_quiz_stats(self.quiz)
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).results, 1)
+
+    def test_analytics_page_reads_only_aggregates(self):
+        self.take('a', {self.capital: 'Париж', self.sum: '4'})
+        self.client.force_login(self.owner)
+        url = reverse('quiz_analytics', args=[self.quiz.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, 'Столица Франции?')
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_quizattempt' in q['sql']])
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_quizresult' in q['sql']])
+
+    def test_analytics_is_private_to_owner(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('course_analytics', args=[self.quiz.course_id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('quiz_analytics', args=[self.quiz.pk])).status_code, 404)
+
+
+class QueryPatternIndexTests(QuizTestCase):
+    def test_double_submit_keeps_single_result(self):
+        question = self.add_question('Язык?', 'Python')
+        self.client.force_login(self.student)
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        self.client.post(url, {f'q{question.pk}': 'Python'})
+        response = self.client.post(url, {f'q{question.pk}': 'Java'})
+        self.assertEqual(response.status_code, 200)
+        result = QuizResult.objects.get(quiz=self.quiz, student=self.student)
+        self.assertEqual((result.score, result.attempts.count()), (100, 1))
+
+    def test_dataset_generator_counts(self):
+        counts = generate_dataset(DatasetSpec(users=10, courses=2, questions_per_quiz=3, results_per_user=1, prefix='t'))
+        self.assertEqual(counts['Course'], 2)
+        self.assertEqual(counts['Question'], 2 * 2 * 3)
+        self.assertEqual(QuizResult.objects.filter(student__username__startswith='t_user_').count(), 10)
+
+
+class BenchmarkTests(ReplicaMirrorMixin, TestCase):
+    def test_generate_dataset_command_is_reproducible(self):
+        options = dict(users=6, courses=2, questions_per_quiz=2, prefix='a', stdout=io.StringIO())
+        call_command('generate_dataset', **options)
+        first = list(Enrollment.objects.order_by('pk').values_list('student__username', 'course__title'))
+        Enrollment.objects.all().delete()
+        User.objects.filter(username__startswith='a_user_').delete()
+        call_command('generate_dataset', **options)
+        self.assertEqual(list(Enrollment.objects.order_by('pk').values_list('student__username', 'course__title')), first)
+
+    def test_view_benchmark_rolls_back_writes(self):
+        generate_dataset(DatasetSpec(users=5, courses=2, questions_per_quiz=3, results_per_user=0, prefix='v'))
+        student = User.objects.filter(username__startswith='v_user_', enrollments__isnull=False).first()
+        quiz = Quiz.objects.filter(course__enrollments__student=student).select_related('course__owner').first()
+        questions = quiz.questions.count()
+
+        report = measure_views(view_scenarios(student, quiz.course.owner, quiz), repeat=2, warmup=0)
+
+        self.assertEqual(report['take_quiz_post']['statuses'], [200])
+        self.assertEqual(report['import_questions']['statuses'], [302])
+        self.assertGreater(report['dashboard']['queries_max'], 0)
+        self.assertFalse(QuizResult.objects.filter(quiz=quiz, student=student).exists())
+        self.assertEqual(quiz.questions.count(), questions)
+
+    def test_benchmark_csv_reimports_current_questions_unchanged(self):
+        generate_dataset(DatasetSpec(users=5, courses=1, questions_per_quiz=3, results_per_user=0, prefix='c'))
+        quiz = Quiz.objects.order_by('pk').first()
+        report = import_quiz_questions(quiz, io.BytesIO(quiz_csv(quiz, extra=0)), incremental=True)
+        self.assertFalse(report.changed)
+        report = import_quiz_questions(quiz, io.BytesIO(quiz_csv(quiz, extra=2)), incremental=True)
+        self.assertEqual(
+            (report.questions_created, report.answers_created, report.questions_without_correct),
+            (2, 2, 0),
+        )
+        self.assertEqual(
+            (report.questions_updated, report.questions_deleted, report.answers_updated, report.answers_deleted),
+            (0, 0, 0, 0),
+        )
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_FLUSH_EVERY=1)
+class RequestProfilingTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(REQUEST_PROFILING_DIR=directory.name))
+        profiling.buffer.clear()
+        self.addCleanup(profiling.buffer.clear)
+
+    def test_request_is_profiled_by_url_name(self):
+        self.add_question('Язык?', 'Python')
+        self.client.force_login(self.owner)
+        self.client.get(reverse('edit_quiz', args=[self.quiz.pk]))
+        entry = profiling.buffer.snapshot()[-1]
+        self.assertEqual((entry['view'], entry['status']), ('edit_quiz', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertIn('courses/edit_quiz.html', entry['templates'])
+
+    async def test_async_requests_count_queries_from_worker_threads(self):
+        def query():
+            # Отдельный поток со своим соединением, как у sync_to_async в async-view
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            finally:
+                connection.close()
+
+        async def view(request):
+            await sync_to_async(query, thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = profiling.RequestProfilingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(RequestFactory().get('/'))
+        entry = profiling.buffer.snapshot()[-1]
+        self.assertEqual((entry['view'], entry['queries']), ('unresolved', 1))
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        self.assertEqual(
+            profiling.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND name = \'x\''),
+            'SELECT ? FROM t WHERE id IN (...) AND name = ?',
+        )
+        profile = profiling.RequestProfile(view='v', method='GET', path='/', started_at=0)
+        for _ in range(3):
+            profile.record_query('SELECT * FROM t WHERE id = %s', 1.0)
+        self.assertEqual(profile.as_dict()['duplicates'], {'SELECT * FROM t WHERE id = %s': 3})
+
+    def test_report_is_staff_only_and_dumped_from_snapshots(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse('profiling_report')).status_code, 302)
+        self.owner.is_staff = True
+        self.owner.save()
+        response = self.client.get(reverse('profiling_report'), {'format': 'json'})
+        self.assertIn('profiling_report', [row['view'] for row in response.json()['views']])
+
+        # Снимок другого процесса: буфер текущего пуст
+        os.replace(profiling.snapshot_path(), profiling.snapshot_path(pid=1))
+        profiling.buffer.clear()
+        output = io.StringIO()
+        call_command('dump_profiling', stdout=output)
+        self.assertIn('profiling_report', [row['view'] for row in json.loads(output.getvalue())['views']])
+
+
+class CourseCatalogueTests(ReplicaMirrorMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.courses = [Course.objects.create(title=f'Курс {i}', description='', owner=self.owner) for i in range(5)]
+
+    def test_keyset_pages_cover_all_courses_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = build_catalogue_page(cursor, page_size=2)
+            seen.extend(course.pk for course in page.courses)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((c.pk for c in self.courses), reverse=True))
+
+    def test_enrolled_flag_for_visible_page(self):
+        student = User.objects.create_user('student')
+        Enrollment.objects.create(student=student, course=self.courses[0])
+        self.client.force_login(student)
+        response = self.client.get(reverse('course_list'))
+        self.assertEqual(response.context['enrolled_courses'], {self.courses[0].pk})
+        self.assertContains(response, 'Вы записаны на курс', count=1)
+
+    def test_anonymous_catalogue_served_from_cache_until_course_changes(self):
+        self.client.get(reverse('course_list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('course_list'))
+        course = self.courses[-1]
+        course.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertContains(self.client.get(reverse('course_list')), 'Новое название')
+
+
+class SearchTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.quiz.course
+        self.course.title = 'Основы программирования на Python'
+        self.course.save()
+        Module.objects.create(course=self.course, title='Списки и словари', description='Структуры данных')
+
+    def titles(self, query):
+        return [document.title for document in search(query)]
+
+    def test_finds_courses_modules_and_questions(self):
+        self.add_question('Что такое декоратор?')
+        self.assertEqual(self.titles('python'), ['Основы программирования на Python'])
+        self.assertEqual(self.titles('словари'), ['Списки и словари'])
+        self.assertEqual(self.titles('декоратор'), ['Что такое декоратор?'])
+
+    def test_typo_tolerance(self):
+        self.assertIn('Основы программирования на Python', self.titles('програмирования'))
+
+    def test_import_indexes_questions_and_delete_cleans_up(self):
+        import_quiz_questions(self.quiz, csv_upload('Что вернёт len([])?,0,1'))
+        self.assertEqual(self.titles('len'), ['Что вернёт len([])?'])
+        import_quiz_questions(self.quiz, csv_upload('Сколько будет 2 + 2?,4,1'))
+        self.assertEqual(self.titles('len'), [])
+
+    def test_rebuild_and_view(self):
+        self.assertEqual(rebuild_search_index(), 2)
+        response = self.client.get(reverse('search'), {'q': 'словари'})
+        self.assertContains(response, reverse('course_detail', args=[self.course.pk]))
+
+    def test_anonymous_search_hides_questions(self):
+        self.add_question('Что такое декоратор?')
+        self.assertNotContains(self.client.get(reverse('search'), {'q': 'декоратор'}), 'Что такое декоратор?')
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get(reverse('search'), {'q': 'декоратор'}), 'Что такое декоратор?')
+
+
+class QuizApiTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+        self.url = reverse('api_quiz', args=[self.quiz.pk])
+        self.client.force_login(self.student)
+
+    def submit(self, answers, **headers):
+        return self.client.post(
+            reverse('api_submit_quiz', args=[self.quiz.pk]),
+            json.dumps({'answers': answers}), content_type='application/json', headers=headers,
+        )
+
+    def test_quiz_is_etag_validated(self):
+        response = self.client.get(self.url)
+        self.assertEqual([q['text'] for q in response.json()['questions']], ['Столица Франции?', '2 + 2?'])
+        self.assertNotIn('Париж', response.content.decode())
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_question('Новый вопрос', 'да')
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_submission_is_graded_like_the_form(self):
+        response = self.submit([
+            {'question_id': self.capital.pk, 'answer': ' париж '},
+            {'question_id': self.sum.pk, 'answer': '5'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['score'], data['correct_count'], data['total']), (50, 1, 2))
+        self.assertEqual([a['is_correct'] for a in data['answers']], [True, False])
+        self.assertEqual(self.submit([]).status_code, 409)
+
+    def test_invalid_payloads(self):
+        bad_json = self.client.post(
+            reverse('api_submit_quiz', args=[self.quiz.pk]), 'не json', content_type='application/json',
+        )
+        self.assertEqual(bad_json.status_code, 400)
+        self.assertEqual(self.submit([{'question_id': 999999, 'answer': 'x'}]).status_code, 400)
+        self.assertEqual(self.submit([], **{'If-Match': '"v1-quiz-0-0"'}).status_code, 412)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_answers_longer_than_the_column_are_rejected(self):
+        long_answer = 'а' * (ANSWER_MAX_LENGTH + 1)
+        self.assertEqual(self.submit([{'question_id': self.capital.pk, 'answer': long_answer}]).status_code, 400)
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        response = self.client.post(url, {f'q{self.capital.pk}': long_answer, f'q{self.sum.pk}': '4'})
+        self.assertRedirects(response, url)
+        self.assertFalse(QuizResult.objects.exists())
+
+
+class AsyncUrls:
+    urlpatterns = [
+        path('dashboard/', async_views.dashboard, name='dashboard'),
+        path('quiz/<int:quiz_id>/take/', async_views.take_quiz, name='take_quiz'),
+        path('api/v1/quizzes/<int:quiz_id>/', async_views.api_quiz_detail, name='api_quiz'),
+        path('api/v1/quizzes/<int:quiz_id>/submissions/', async_views.api_submit_quiz, name='api_submit_quiz'),
+        path('', include('config.urls')),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncUrls)
+class AsyncViewTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+        Enrollment.objects.create(student=self.student, course=self.quiz.course)
+
+    async def test_take_quiz_grades_and_shows_result(self):
+        await self.async_client.aforce_login(self.student)
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        self.assertContains(await self.async_client.get(url), 'Столица Франции?')
+        response = await self.async_client.post(url, {f'q{self.capital.pk}': 'Париж', f'q{self.sum.pk}': '5'})
+        self.assertEqual(response.context['result'].score, 50)
+        result = await QuizResult.objects.aget(quiz=self.quiz, student=self.student)
+        self.assertEqual(await result.attempts.acount(), 2)
+        self.assertTrue((await self.async_client.get(url)).context['already_taken'])
+
+    async def test_dashboard(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, 'Курс')
+        self.assertEqual(response.context['enrollments'][0].total_modules, 0)
+
+    async def test_api_matches_sync_grading(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('api_quiz', args=[self.quiz.pk]))
+        cached = await self.async_client.get(
+            reverse('api_quiz', args=[self.quiz.pk]), headers={'If-None-Match': response['ETag']},
+        )
+        self.assertEqual(cached.status_code, 304)
+        submitted = await self.async_client.post(
+            reverse('api_submit_quiz', args=[self.quiz.pk]),
+            json.dumps({'answers': [{'question_id': self.capital.pk, 'answer': 'париж'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(submitted.status_code, 201)
+        self.assertEqual(submitted.json()['score'], 50)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(TestCase):
+    def route(self, method, view, cookies=None):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        seen = []
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        middleware.process_view(request, view, (), {})
+        seen.append(ReplicaRouter().db_for_read(Course))
+        response = middleware.process_response(request, HttpResponse())
+        seen.append(ReplicaRouter().db_for_read(Course))
+        return seen, response
+
+    def test_read_only_views_use_replica_for_the_request(self):
+        from courses.views import CourseListView, take_quiz
+        self.assertEqual(self.route('get', CourseListView.as_view())[0], ['replica', 'default'])
+        self.assertEqual(self.route('get', take_quiz)[0], ['default', 'default'])
+        self.assertEqual(self.route('post', CourseListView.as_view())[0], ['default', 'default'])
+
+    def test_writes_pin_reads_to_primary(self):
+        from courses.views import CourseListView
+        _, response = self.route('post', CourseListView.as_view())
+        self.assertIn(PIN_COOKIE, response.cookies)
+        seen, _ = self.route('get', CourseListView.as_view(), cookies={PIN_COOKIE: '1'})
+        self.assertEqual(seen, ['default', 'default'])
+
+    def test_write_inside_request_switches_back_to_primary(self):
+        from courses.views import CourseListView
+        request = RequestFactory().get('/')
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        middleware.process_view(request, CourseListView.as_view(), (), {})
+        self.assertEqual(ReplicaRouter().db_for_write(Course), 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Course), 'default')
+        middleware.process_response(request, HttpResponse())
+
+    def test_cache_fill_reads_from_primary(self):
+        from courses.views import CourseListView
+        cache.clear()
+        request = RequestFactory().get('/')
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        middleware.process_view(request, CourseListView.as_view(), (), {})
+        get_catalogue_page()
+        self.assertEqual(ReplicaRouter().db_for_read(Course), 'default')
+        middleware.process_response(request, HttpResponse())
+        # Страница уже в кэше: остальные чтения запроса снова можно отдать реплике
+        middleware.process_view(request, CourseListView.as_view(), (), {})
+        get_catalogue_page()
+        self.assertEqual(ReplicaRouter().db_for_read(Course), 'replica')
+        middleware.process_response(request, HttpResponse())
+
+
+@override_settings(QUIZ_SUBMISSION_BUFFER=True, QUIZ_ANALYTICS_LIVE=True)
+class SubmissionBufferTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+        self.client.force_login(self.student)
+        self.url = reverse('take_quiz', args=[self.quiz.pk])
+
+    def submit(self):
+        return self.client.post(self.url, {f'q{self.capital.pk}': 'Париж', f'q{self.sum.pk}': '5'})
+
+    def test_submission_is_buffered_then_drained(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.submit()
+        self.assertEqual(response.context['result'].score, 50)
+        self.assertTrue(response.context['pending'])
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]), 1)
+        self.assertFalse(QuizResult.objects.exists())
+
+        self.submit()
+        conflict = self.client.post(
+            reverse('api_submit_quiz', args=[self.quiz.pk]), json.dumps({'answers': []}), content_type='application/json',
+        )
+        self.assertEqual((conflict.status_code, conflict.json()['result']['status']), (409, 'pending'))
+        self.assertEqual(PendingSubmission.objects.count(), 1)
+
+        self.assertEqual(drain_submissions(), 1)
+        self.assertEqual(drain_submissions(), 0)
+        result = QuizResult.objects.get(quiz=self.quiz, student=self.student)
+        self.assertEqual([a.is_correct for a in result.attempts.order_by('question_id')], [True, False])
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).results, 1)
+        self.assertFalse(self.client.get(self.url).context['pending'])
+
+    def test_drain_does_not_double_count_saved_results(self):
+        graded = grade_submission(get_answer_key(self.quiz), {self.capital.pk: 'Париж'})
+        save_submission(self.quiz, self.student, graded)
+        PendingSubmission.objects.create(quiz=self.quiz, student=self.student, score=graded.score, answers=[])
+        self.assertEqual(drain_submissions(), 1)
+        self.assertEqual(QuizResult.objects.count(), 1)
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).results, 1)
+        self.assertFalse(PendingSubmission.objects.exists())
+
+    def test_retake_after_buffered_submission_gets_next_number(self):
+        self.submit()
+        self.assertNotContains(self.client.get(self.url), 'Пройти тест снова')
+        drain_submissions()
+        self.client.post(reverse('restart_quiz_for_user', args=[self.quiz.pk]))
+        self.assertContains(self.client.get(self.url), 'Столица Франции?')
+        self.submit()
+        drain_submissions()
+        self.assertEqual(list(QuizResult.objects.order_by('number').values_list('number', flat=True)), [1, 2])
+        self.assertEqual(QuizScoreSummary.objects.get().attempts, 2)
+
+
+class CompactAttemptStorageTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+        self.client.force_login(self.student)
+        self.url = reverse('take_quiz', args=[self.quiz.pk])
+
+    def submit(self):
+        self.client.post(self.url, {f'q{self.capital.pk}': 'Париж', f'q{self.sum.pk}': '5'})
+        return QuizResult.objects.get(quiz=self.quiz, student=self.student)
+
+    def shown_answers(self):
+        rows = self.client.get(self.url).context['result'].answer_rows
+        return [(row.question.text, row.answer, row.is_correct) for row in rows]
+
+    @override_settings(QUIZ_ATTEMPT_ROWS=False)
+    def test_compact_mode_keeps_only_the_result_row(self):
+        result = self.submit()
+        self.assertFalse(QuizAttempt.objects.exists())
+        self.assertEqual([row[0] for row in result.answers], [self.capital.pk, self.sum.pk])
+        self.assertEqual(self.shown_answers(), [('Столица Франции?', 'Париж', True), ('2 + 2?', '5', False)])
+        compact_quiz_stats(self.quiz)
+        self.assertEqual(QuestionStats.objects.get(question=self.sum).attempts, 1)
+
+    def test_old_attempts_move_to_archive(self):
+        result = self.submit()
+        QuizAttempt.objects.update(created_at=timezone.now() - timedelta(days=120))
+        call_command('archive_attempts', days=90, stdout=io.StringIO())
+        self.assertFalse(QuizAttempt.objects.exists())
+        archived = QuizAttemptArchive.objects.order_by('question_id')
+        self.assertEqual([(a.result_id, a.is_correct, a.month.day) for a in archived], [(result.pk, True, 1), (result.pk, False, 1)])
+        self.assertEqual(self.shown_answers(), [('Столица Франции?', 'Париж', True), ('2 + 2?', '5', False)])
+
+    def test_attempt_keeps_the_correct_answer_it_was_graded_against(self):
+        self.submit()
+        attempt = QuizAttempt.objects.get(question=self.sum)
+        self.assertEqual((attempt.correct_answer, attempt.correct_text), (self.sum.answers.get(), '4'))
+        QuizAttempt.objects.update(created_at=timezone.now() - timedelta(days=120))
+        call_command('archive_attempts', days=90, stdout=io.StringIO())
+        self.assertEqual(QuizAttemptArchive.objects.get(question=self.sum).correct_text, '4')
+
+    def test_review_shows_stored_answers_after_the_key_changes(self):
+        self.submit()
+        self.sum.answers.update(text='четыре')
+        response = self.client.get(self.url)
+        self.assertContains(response, '<em>Правильный ответ:</em> 4</p>', html=False)
+        self.assertNotContains(response, 'четыре')
+
+        call_command('archive_attempts', drop_before=timezone.now().strftime('%Y-%m'), stdout=io.StringIO())
+        self.assertFalse(QuizAttemptArchive.objects.exists())
+
+
+class RetakeHistoryTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.sum = self.add_question('2 + 2?', '4')
+        self.client.force_login(self.student)
+        self.url = reverse('take_quiz', args=[self.quiz.pk])
+
+    def take(self, capital, total):
+        self.client.post(self.url, {f'q{self.capital.pk}': capital, f'q{self.sum.pk}': total})
+
+    def test_retake_keeps_history_and_summary(self):
+        self.take('Париж', '4')
+        self.client.post(reverse('restart_quiz_for_user', args=[self.quiz.pk]))
+        self.assertEqual(QuizResult.objects.count(), 1)
+        self.assertIn('questions', self.client.get(self.url).context)
+        self.take('Лион', '4')
+
+        results = QuizResult.objects.order_by('number')
+        self.assertEqual([(r.number, r.score) for r in results], [(1, 100), (2, 50)])
+        summary = QuizScoreSummary.objects.get(quiz=self.quiz, student=self.student)
+        self.assertEqual(
+            (summary.attempts, summary.best_score, summary.best_number, summary.last_score, summary.last_result_id),
+            (2, 100, 1, 50, results[1].pk),
+        )
+        first = self.client.get(self.url, {'session': 1}).context['result']
+        self.assertEqual((first.number, first.score), (1, 100))
+
+    def test_results_page_reads_without_writes(self):
+        self.take('Париж', '5')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['result'].number, 1)
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertFalse([q for q in sql if q.startswith(('INSERT', 'UPDATE', 'DELETE'))])
+        # Тест, сводка с последней попыткой и вопросы разбора
+        self.assertEqual(len([q for q in sql if 'courses_' in q]), 3)
+
+
+class GradebookTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.capital = self.add_question('Столица Франции?', 'Париж')
+        self.second = Quiz.objects.create(course=self.quiz.course, title='Тест 2')
+        self.other = User.objects.create_user('other', email='other@example.com')
+        for student in (self.student, self.other):
+            Enrollment.objects.create(student=student, course=self.quiz.course)
+        save_submission(self.quiz, self.student, grade_submission(get_answer_key(self.quiz), {self.capital.pk: 'Париж'}))
+        self.client.force_login(self.owner)
+
+    def export(self, fmt):
+        response = self.client.get(reverse('course_gradebook', args=[self.quiz.course.pk, fmt]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_pivots_scores_per_student(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv').decode('utf-8-sig'))))
+        self.assertEqual(rows, [
+            ['Студент', 'Email', 'Тест', 'Тест 2'],
+            ['student', '', '100.00', ''],
+            ['other', 'other@example.com', '', ''],
+        ])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        with zipfile.ZipFile(io.BytesIO(self.export('xlsx'))) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+            self.assertIn('xl/workbook.xml', archive.namelist())
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', namespace)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1].findall('s:c', namespace)[2].findtext('s:v', namespaces=namespace), '100.00')
+
+    def test_only_owner_can_export(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('course_gradebook', args=[self.quiz.course.pk, 'csv'])).status_code, 404)
+
+
+class QuizReadModelTests(QuizTestCase):
+    def editor_queries(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('edit_quiz', args=[self.quiz.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_editor_tree_has_flags_and_answers(self):
+        with_answer = self.add_question('Есть ответ', 'да', wrong=['нет'])
+        without_answer = self.add_question('Нет ответа', wrong=['нет'])
+        response, _ = self.editor_queries()
+        tree = response.context['quiz'].question_tree
+        self.assertEqual([(q.pk, q.has_correct) for q in tree], [(with_answer.pk, True), (without_answer.pk, False)])
+        self.assertEqual([a.text for a in tree[0].answers.all()], ['да', 'нет'])
+        self.assertContains(response, 'Нет правильного ответа', count=1)
+
+    def test_editor_query_count_does_not_grow_with_questions(self):
+        self.add_question('Вопрос', 'да')
+        _, few = self.editor_queries()
+        for i in range(30):
+            self.add_question(f'Ещё {i}', 'да', wrong=['нет'])
+        _, many = self.editor_queries()
+        self.assertEqual(many, few)
+
+    def test_saving_the_quiz_skips_the_question_tree(self):
+        self.add_question('Вопрос', 'да')
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('edit_quiz', args=[self.quiz.pk]), {'title': 'Новое', 'description': ''})
+        self.assertRedirects(response, reverse('course_detail', args=[self.quiz.course_id]), fetch_redirect_response=False)
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_answer' in q['sql']])
+
+
+class FragmentCacheTests(QuizTestCase):
+    def test_course_page_fragment_refreshes_when_quiz_is_added(self):
+        self.client.force_login(self.owner)
+        url = reverse('course_detail', args=[self.quiz.course_id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_quiz' in q['sql']])
+        self.assertContains(response, 'delete-quiz-form')
+        with self.captureOnCommitCallbacks(execute=True):
+            Quiz.objects.create(course=self.quiz.course, title='Второй тест')
+        self.assertContains(self.client.get(url), 'Второй тест')
+
+    def test_question_block_is_cached_per_quiz_version(self):
+        question = self.add_question('Столица Франции?', 'Париж')
+        self.client.force_login(self.student)
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertContains(self.client.get(url), 'Столица Франции?')
+        self.assertFalse([q for q in ctx.captured_queries if 'courses_question' in q['sql']])
+        question.text = 'Столица Италии?'
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertContains(self.client.get(url), 'Столица Италии?')
+
+
+class ContentCounterTests(QuizTestCase):
+    def counters(self):
+        course = Course.objects.get(pk=self.quiz.course_id)
+        return course.module_count, course.quiz_count, course.enrollment_count, Quiz.objects.get(pk=self.quiz.pk).question_count
+
+    def test_views_keep_counters_in_step(self):
+        course_id = self.quiz.course_id
+        self.client.force_login(self.owner)
+        self.client.post(reverse('add_module', args=[course_id]), {'title': 'Модуль', 'description': 'Описание'})
+        self.client.post(reverse('create_quiz', args=[course_id]), {'title': 'Второй', 'description': ''})
+        import_quiz_questions(self.quiz, csv_upload('"Вопрос 1", "Да", True', '"Вопрос 2", "Да", True'))
+        self.client.force_login(self.student)
+        self.client.get(reverse('enroll_course', args=[course_id]))
+        self.client.get(reverse('enroll_course', args=[course_id]))
+        self.assertEqual(self.counters(), (1, 1, 1, 2))
+        self.client.force_login(self.owner)
+        self.client.post(reverse('course_detail', args=[course_id]), {'delete_module_id': Module.objects.get().pk})
+        self.client.post(reverse('delete_quiz', args=[Quiz.objects.get(title='Второй').pk]))
+        self.assertEqual(self.counters(), (0, 0, 1, 2))
+
+    def test_single_questions_keep_question_count(self):
+        question = self.add_question('Язык?', 'Python')
+        self.add_question('Фреймворк?', 'Django')
+        self.assertEqual(self.counters()[3], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        self.assertEqual(self.counters()[3], 1)
+        import_quiz_questions(self.quiz, csv_upload('"Вопрос 1", "Да", True', '"Вопрос 2", "Да", True'))
+        self.assertEqual(self.counters()[3], 2)
+
+    def test_reconcile_repairs_drift(self):
+        # bulk_create сигналов не шлёт, счётчик вопросов расходится
+        Question.objects.bulk_create([Question(quiz=self.quiz, text='Язык?')])
+        Module.objects.create(course=self.quiz.course, title='Модуль', description='')
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено строк: 3', out.getvalue())
+        self.assertEqual(self.counters(), (1, 1, 0, 1))
+        self.assertEqual(sum(reconcile_counters(dry_run=True).values()), 0)
+
+
+def roster_upload(*rows):
+    content = '\ufeff' + '\r\n'.join(rows) + '\r\n'
+    return SimpleUploadedFile('roster.csv', content.encode('utf-8'), content_type='text/csv')
+
+
+class RosterEnrollmentTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.quiz.course
+        self.cohort = [User.objects.create_user(f'cohort{i}', email=f'Cohort{i}@example.com') for i in range(5)]
+
+    def test_roster_import_reports_created_existing_and_unknown(self):
+        Enrollment.objects.create(student=self.cohort[0], course=self.course)
+        report = import_roster(self.course, roster_upload(
+            'username', 'cohort0', 'cohort1', 'cohort2@EXAMPLE.com', 'cohort1', 'nobody', 'cohort3', 'cohort4',
+        ), batch_size=2)
+        self.assertEqual(
+            (report.rows_read, report.created, report.existing, report.unknown, report.duplicates),
+            (7, 4, 1, 1, 1),
+        )
+        self.assertEqual(report.unknown_sample, ['nobody'])
+        self.assertEqual(self.course.enrollments.count(), 5)
+        self.assertEqual(set(self.course.students.values_list('username', flat=True)), {f'cohort{i}' for i in range(1, 5)})
+        self.assertEqual(Course.objects.get(pk=self.course.pk).enrollment_count, 4)
+
+    def test_single_enroll_uses_the_same_upsert(self):
+        self.client.force_login(self.student)
+        for _ in range(2):
+            self.client.get(reverse('enroll_course', args=[self.course.pk]))
+        self.assertEqual(list(self.course.students.all()), [self.student])
+        self.assertEqual(Course.objects.get(pk=self.course.pk).enrollment_count, 1)
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('import_roster', args=[self.course.pk]), {'file': roster_upload('student', 'cohort0')}, follow=True,
+        )
+        self.assertContains(response, 'записано: 1, уже на курсе: 1')
+
+    def test_email_lookup_has_an_expression_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        self.assertTrue(constraints['user_email_lower']['index'])
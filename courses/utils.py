@@ -1,24 +1,49 @@
 import csv
+import io
+from rapidfuzz import fuzz
 
-def parse_quiz_file(file_obj):
-    decoded = file_obj.read().decode('utf-8').splitlines()
-    reader = csv.DictReader(decoded)
-    quiz_data = {}
 
-    for row in reader:
-        qtext = row.get('question', '').strip()
-        answer_text = row.get('answer', '').strip()
-        is_correct = str(row.get('is_correct', '')).lower() == 'true'
+def normalize_answer(text):
+    return (text or '').strip().lower()
 
-        if not qtext or not answer_text:
-            continue
 
-        if qtext not in quiz_data:
-            quiz_data[qtext] = []
+def get_match_score(user_answer: str, correct_answer: str) -> float:
+    return fuzz.token_set_ratio(normalize_answer(user_answer), normalize_answer(correct_answer)) / 100.0
 
-        quiz_data[qtext].append({
-            'text': answer_text,
-            'is_correct': is_correct
-        })
 
-    return [{'text': question, 'answers': answers} for question, answers in quiz_data.items()]
+def iter_quiz_rows(file_obj, encoding='utf-8-sig'):
+    # TextIOWrapper декодирует загрузку по мере чтения, не держа файл в памяти целиком
+    text = io.TextIOWrapper(file_obj, encoding=encoding, newline='')
+    try:
+        for row in csv.DictReader(text, skipinitialspace=True):
+            yield (
+                (row.get('question') or '').strip(),
+                (row.get('answer') or '').strip(),
+                str(row.get('is_correct', '')).strip().lower() == 'true',
+            )
+    finally:
+        text.detach()
+
+
+ROSTER_HEADERS = {'username', 'email', 'login', 'логин'}
+
+
+def iter_roster_rows(file_obj, encoding='utf-8-sig'):
+    # Первая колонка — логин или email; строка заголовка, если есть, пропускается
+    text = io.TextIOWrapper(file_obj, encoding=encoding, newline='')
+    try:
+        for index, row in enumerate(csv.reader(text, skipinitialspace=True)):
+            identifier = row[0].strip() if row else ''
+            if not identifier or (index == 0 and identifier.lower() in ROSTER_HEADERS):
+                continue
+            yield identifier
+    finally:
+        text.detach()
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -1,51 +1,92 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, get_object_or_404, render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
-from django.views.generic import ListView, DetailView, FormView, UpdateView
+from django.views.generic import ListView, DetailView, FormView, TemplateView, UpdateView
 from django.views.generic.edit import CreateView
-from courses.models import Enrollment, Module, Course, Progress, Quiz, Answer, QuizResult, Question, QuizAttempt
-from courses.utils import parse_quiz_file
-from rapidfuzz import fuzz
-from courses.forms import UploadFileForm
-from django.db import transaction
+from courses.models import Enrollment, ImportJob, Module, Course, Quiz, SearchDocument
+from courses.cache import course_version_name, fragment_cached, get_version, get_versions, quiz_version_name
+from courses.catalogue import enrolled_course_ids, get_catalogue_page
+from courses.counters import add_to_counter
+from courses.analytics import hardest_questions, score_summary
+from courses.gradebook import XLSX_CONTENT_TYPE, gradebook_header, gradebook_rows, stream_csv, stream_xlsx
+from courses.grading import ANSWER_MAX_LENGTH, answers_too_long, get_answer_key, grade_submission, invalidate_answer_key
+from courses.readmodels import quiz_editor_queryset, quiz_form_questions
+from courses.profiling import collect_profiles, summarize
+from courses.routers import read_from_primary, replica_reads
+from courses.search import search
+from courses.results import is_pending, open_retake, select_session
+from courses.submissions import find_submission, store_submission
+from courses.progress import complete_module, enrollments_with_progress, refresh_course_progress
+from courses.importing import import_quiz_questions
+from courses.jobs import enqueue_import, should_import_in_background
+from courses.forms import RosterUploadForm, UploadFileForm
+from courses.enrollment import enroll_students, import_roster
 
 class DashboardView(LoginRequiredMixin, ListView):
+    replica_reads = True
     model = Enrollment
     template_name = 'dashboard.html'
     login_url = 'login'
     context_object_name = 'enrollments'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['enrollments'] = Enrollment.objects.filter(student=self.request.user)
-        return context
+    def get_queryset(self):
+        return enrollments_with_progress(self.request.user)
 
 class CourseDetailView(DetailView):
+    replica_reads = True
     model = Course
     template_name = 'courses/course_detail.html'
     context_object_name = 'course'
 
-    def post(self, request):
+    def get_object(self, queryset=None):
+        self.course_version = get_version(course_version_name(self.kwargs['pk']))
+        if not fragment_cached('course_detail', self.kwargs['pk'], self.course_version):
+            read_from_primary()
+        return super().get_object(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['course_version'] = self.course_version
+        return context
+
+    def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         module_id = request.POST.get('delete_module_id')
         if module_id and self.object.owner == request.user:
-            Module.objects.filter(id=module_id, course=self.object).delete()
+            with transaction.atomic():
+                _, deleted = Module.objects.filter(id=module_id, course=self.object).delete()
+                add_to_counter(Course, self.object.pk, 'module_count', -deleted.get(Module._meta.label, 0))
+            refresh_course_progress([self.object])
         return redirect('course_detail', pk=self.object.pk)
 
-class CourseListView(ListView):
-    model = Course
-    template_name = 'courses/courses_list.html'
-    context_object_name = 'courses'
+class CourseListView(TemplateView):
+    replica_reads = True
+    template_name = 'courses/course_list.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-        enrolled_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True) if user.is_authenticated else []
-        context['enrolled_courses'] = set(enrolled_ids)
+        page = get_catalogue_page(self.request.GET.get('after'))
+        enrolled = enrolled_course_ids(self.request.user, page.courses)
+        versions = get_versions([course_version_name(course.pk) for course in page.courses])
+        for course in page.courses:
+            course.card_version = versions[course_version_name(course.pk)]
+        context.update({
+            'courses': page.courses,
+            'cursor': page.cursor or '',
+            'next_cursor': page.next_cursor,
+            'catalogue_version': page.version,
+            'enrolled_courses': enrolled,
+            # Входит в ключ кэша фрагмента: у записанного студента другие кнопки
+            'enrolled_key': ','.join(map(str, sorted(enrolled))),
+        })
         return context
 
 class RegisterView(FormView):
@@ -62,8 +103,8 @@ class RegisterView(FormView):
 @login_required
 def enroll_course(request, pk):
     course = get_object_or_404(Course, pk=pk)
-    if not Enrollment.objects.filter(student=request.user, course=course).exists():
-        Enrollment.objects.create(student=request.user, course=course)
+    created, _ = enroll_students(course, [request.user.pk])
+    if created:
         messages.success(request, "Вы успешно записались на курс")
     else:
         messages.info(request, "Вы уже записаны на этот курс")
@@ -73,7 +114,7 @@ def enroll_course(request, pk):
 @require_POST
 def mark_module_complete(request, pk):
     module = get_object_or_404(Module, pk=pk)
-    Progress.objects.get_or_create(student=request.user, module=module)
+    complete_module(request.user, module)
     messages.success(request, f"Модуль {module.title} выполнен")
     return redirect('course_detail', pk=module.course.pk)
 
@@ -95,7 +136,10 @@ class AddModuleView(CreateView):
 
     def form_valid(self, form):
         form.instance.course = get_object_or_404(Course, pk=self.kwargs['pk'])
-        return super().form_valid(form)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            add_to_counter(Course, form.instance.course_id, 'module_count', 1)
+        return response
 
     def get_success_url(self):
         return reverse('course_detail', kwargs={'pk': self.kwargs['pk']})
@@ -105,7 +149,7 @@ class MyCoursesView(LoginRequiredMixin, ListView):
     template_name = 'my_courses.html'
 
     def get_queryset(self):
-        return Course.objects.filter(owner=self.request.user)
+        return Course.objects.filter(owner=self.request.user).order_by('-created_at')
 
 class CreateCourseView(CreateView):
     model = Course
@@ -119,73 +163,53 @@ class CreateCourseView(CreateView):
     def get_success_url(self):
         return reverse('my_courses')
 
-def get_match_score(user_answer: str, correct_answer: str) -> float:
-    return fuzz.token_set_ratio(user_answer.strip().lower(), correct_answer.strip().lower()) / 100.0
+def session_number(request):
+    try:
+        return int(request.GET['session'])
+    except (KeyError, ValueError):
+        return None
+
+
+def taken_context(quiz, result):
+    context = {'quiz': quiz, 'already_taken': True, 'result': result, 'pending': is_pending(result)}
+    if not context['pending']:
+        context['sessions'] = range(1, result.summary.attempts + 1)
+    return context
+
 
 @login_required
 def take_quiz(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions = quiz.questions.all()
 
-    existing_result = QuizResult.objects.filter(quiz=quiz, student=request.user).first()
+    # GET ничего не пишет: сводка и выбранная попытка только читаются
+    existing_result = find_submission(quiz, request.user)
     if existing_result:
-        existing_result.attempts.set(
-            QuizAttempt.objects.filter(user=request.user, question__quiz=quiz)
-        )
-        return render(request, 'take_quiz.html', {
-            'quiz': quiz,
-            'already_taken': True,
-            'result': existing_result
-        })
+        result = select_session(existing_result, session_number(request))
+        return render(request, 'take_quiz.html', taken_context(quiz, result))
 
     if request.method == 'POST':
-        with transaction.atomic():
-            score = 0
-            result = QuizResult.objects.create(
-                quiz=quiz,
-                student=request.user,
-                score=0
-            )
-
-            for question in questions:
-                user_answer = request.POST.get(f'q{question.id}', '').strip()
-                correct = question.answers.filter(is_correct=True).first()
-                correct_text = correct.text if correct else ''
-
-                match_score = get_match_score(user_answer, correct_text)
-                is_correct = match_score >= 0.85
-
-                attempt = QuizAttempt.objects.create(
-                    user=request.user,
-                    question=question,
-                    answer=user_answer,
-                    match_score=match_score,
-                    is_correct=is_correct
-                )
-
-                attempt.selected_answer = type('AnswerView', (), {'text': user_answer})()
-                attempt.correct_answer = correct
-                attempt.save()
-
-                result.attempts.add(attempt)
-
-                if is_correct:
-                    score += 1
-
-            result.score = round((score / questions.count()) * 100, 2)
-            result.save()
-
-        return render(request, 'take_quiz.html', {
-            'quiz': quiz,
-            'already_taken': True,
-            'result': result
-        })
+        key = get_answer_key(quiz)
+        submitted = {question_id: request.POST.get(f'q{question_id}', '') for question_id in key.question_ids}
+        if answers_too_long(submitted):
+            messages.error(request, f"Ответ длиннее {ANSWER_MAX_LENGTH} символов")
+            return redirect('take_quiz', quiz_id=quiz.pk)
+        try:
+            result = store_submission(quiz, request.user, grade_submission(key, submitted))
+        except IntegrityError:
+            # Повторная отправка формы: результат уже сохранён параллельным запросом
+            result = find_submission(quiz, request.user)
+            if result is None:
+                raise Http404
+        return render(request, 'take_quiz.html', taken_context(quiz, result))
 
     # Первый GET-запрос
+    # Вопросы читаются лениво: при попадании во фрагментный кэш запроса к ним нет
     return render(request, 'take_quiz.html', {
         'quiz': quiz,
-        'questions': questions
+        'questions': quiz_form_questions(quiz),
+        'quiz_version': get_version(quiz_version_name(quiz.pk)),
     })
+
 class CreateQuizView(LoginRequiredMixin, CreateView):
     model = Quiz
     fields = ['title', 'description']
@@ -193,7 +217,9 @@ class CreateQuizView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.course = get_object_or_404(Course, pk=self.kwargs['pk'])
-        form.save()
+        with transaction.atomic():
+            form.save()
+            add_to_counter(Course, form.instance.course_id, 'quiz_count', 1)
         messages.success(self.request, "Тест создан")
         return redirect('course_detail', pk=form.instance.course.pk)
 
@@ -203,19 +229,16 @@ class EditQuizView(LoginRequiredMixin, UpdateView):
     template_name = 'courses/edit_quiz.html'
 
     def get_queryset(self):
-        return Quiz.objects.all()
+        # Дерево вопросов нужно только странице редактора, сохранению хватает теста с курсом
+        if self.request.method == 'GET':
+            return quiz_editor_queryset()
+        return Quiz.objects.select_related('course')
 
     def get_success_url(self):
         return reverse('course_detail', kwargs={'pk': self.object.course.pk})
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        quiz = self.get_object()
-        question_flags = {
-            question.id: question.answers.filter(is_correct=True).exists()
-            for question in quiz.questions.all()
-        }
-        context['question_flags'] = question_flags
         context['import_form'] = UploadFileForm()
         return context
 
@@ -237,6 +260,11 @@ class EditCourseContentView(LoginRequiredMixin, DetailView):
     def get_queryset(self):
         return Course.objects.filter(owner=self.request.user)
 
+def report_import(request, report):
+    messages.success(request, f"Вопросы импортированы: {report.summary()}")
+    if report.questions_without_correct:
+        messages.warning(request, f"Вопросов без правильного ответа: {report.questions_without_correct}")
+
 class ImportQuizQuestionsView(LoginRequiredMixin, FormView):
     form_class = UploadFileForm
     template_name = 'courses/import_questions.html'
@@ -244,21 +272,133 @@ class ImportQuizQuestionsView(LoginRequiredMixin, FormView):
     def form_valid(self, form):
         quiz = get_object_or_404(Quiz, pk=self.kwargs['quiz_id'], course__owner=self.request.user)
         file = form.cleaned_data['file']
-        quiz.questions.all().delete()
-
-        questions_data = parse_quiz_file(file)
-        for q in questions_data:
-            question = Question.objects.create(quiz=quiz, text=q['text'])
-            for a in q['answers']:
-                Answer.objects.create(
-                    question=question,
-                    text=a['text'],
-                    is_correct=a.get('is_correct', False)
-                )
-
-        messages.success(self.request, "Вопросы успешно импортированы")
+        incremental = form.cleaned_data['incremental']
+        if should_import_in_background(file):
+            job = enqueue_import(quiz, self.request.user, file, incremental=incremental)
+            return redirect('import_job', pk=job.pk)
+
+        report = import_quiz_questions(quiz, file, incremental=incremental)
+        report_import(self.request, report)
+
         return redirect('edit_quiz', pk=quiz.pk)
 
+class ImportRosterView(LoginRequiredMixin, FormView):
+    form_class = RosterUploadForm
+    template_name = 'courses/import_roster.html'
+
+    def get_course(self):
+        return get_object_or_404(Course, pk=self.kwargs['pk'], owner=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['course'] = self.get_course()
+        return context
+
+    def form_valid(self, form):
+        report = import_roster(self.get_course(), form.cleaned_data['file'])
+        messages.success(self.request, f"Список студентов загружен: {report.summary()}")
+        if report.unknown_sample:
+            more = '…' if report.unknown > len(report.unknown_sample) else ''
+            messages.warning(self.request, f"Не найдены: {', '.join(report.unknown_sample)}{more}")
+        return redirect('import_roster', pk=self.kwargs['pk'])
+
+class CourseAnalyticsView(LoginRequiredMixin, DetailView):
+    replica_reads = True
+    model = Course
+    template_name = 'courses/course_analytics.html'
+    context_object_name = 'course'
+
+    def get_queryset(self):
+        return Course.objects.filter(owner=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['quizzes'] = [
+            (quiz, score_summary(getattr(quiz, 'stats', None)))
+            for quiz in self.object.quizzes.select_related('stats').order_by('pk')
+        ]
+        return context
+
+class QuizAnalyticsView(LoginRequiredMixin, DetailView):
+    replica_reads = True
+    model = Quiz
+    template_name = 'courses/quiz_analytics.html'
+    context_object_name = 'quiz'
+
+    def get_queryset(self):
+        return Quiz.objects.filter(course__owner=self.request.user).select_related('stats')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['summary'] = score_summary(getattr(self.object, 'stats', None))
+        context['question_stats'] = hardest_questions(self.object)
+        return context
+
+GRADEBOOK_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_xlsx, XLSX_CONTENT_TYPE),
+}
+
+
+@login_required
+def course_gradebook(request, pk, fmt):
+    if fmt not in GRADEBOOK_FORMATS:
+        raise Http404
+    course = get_object_or_404(Course, pk=pk, owner=request.user)
+    quizzes = list(course.quizzes.order_by('pk').values_list('pk', 'title'))
+    stream, content_type = GRADEBOOK_FORMATS[fmt]
+    # Строки отдаются по мере чтения из БД, весь журнал в памяти не собирается
+    response = StreamingHttpResponse(
+        stream(gradebook_header(quizzes), gradebook_rows(course, quizzes)), content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="gradebook-{course.pk}.{fmt}"'
+    return response
+
+@login_required
+def import_job_detail(request, pk):
+    job = get_object_or_404(ImportJob.objects.select_related('quiz'), pk=pk, owner=request.user)
+    return render(request, 'courses/import_job.html', {'job': job})
+
+@login_required
+def import_job_status(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk, owner=request.user)
+    next_url = ''
+    if job.status == ImportJob.DONE:
+        next_url = reverse('take_quiz' if job.restart_quiz else 'edit_quiz', args=[job.quiz_id])
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'rows_processed': job.rows_processed,
+        'file_size': job.file_size,
+        'report': job.report,
+        'error': job.error,
+        'next_url': next_url,
+    })
+
+@replica_reads
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    kinds = None
+    if not request.user.is_authenticated:
+        # Вопросы тестов видны только после входа, как и сама форма прохождения
+        kinds = [SearchDocument.COURSE, SearchDocument.MODULE]
+    results = search(query, kinds=kinds) if query else []
+    return render(request, 'courses/search.html', {'query': query, 'results': results})
+
+@staff_member_required
+def profiling_report(request):
+    entries = collect_profiles()
+    summary = summarize(entries)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'enabled': settings.REQUEST_PROFILING, 'requests': len(entries), 'views': summary})
+    return render(request, 'courses/profiling.html', {
+        'enabled': settings.REQUEST_PROFILING,
+        'requests': len(entries),
+        'summary': summary,
+        'recent': entries[-20:][::-1],
+    })
+
 @login_required
 @require_POST
 def delete_quiz(request, pk):
@@ -266,7 +406,10 @@ def delete_quiz(request, pk):
     if quiz.course.owner != request.user:
         messages.error(request, "Вы не можете удалить этот тест")
     else:
-        quiz.delete()
+        with transaction.atomic():
+            quiz.delete()
+            add_to_counter(Course, quiz.course_id, 'quiz_count', -1)
+        invalidate_answer_key(pk)
         messages.success(request, "Тест удалён")
     return redirect('course_detail', pk=quiz.course.pk)
 
@@ -281,19 +424,14 @@ def auto_import_and_start_quiz(request, quiz_id):
         return redirect('edit_quiz', pk=quiz.pk)
 
     file = form.cleaned_data['file']
+    incremental = form.cleaned_data['incremental']
+    if should_import_in_background(file):
+        job = enqueue_import(quiz, request.user, file, restart_quiz=True, incremental=incremental)
+        return redirect('import_job', pk=job.pk)
 
-    quiz.questions.all().delete()
-    QuizResult.objects.filter(quiz=quiz, student=request.user).delete()
-
-    questions_data = parse_quiz_file(file)
-    for q in questions_data:
-        question = Question.objects.create(quiz=quiz, text=q['text'])
-        for a in q['answers']:
-            Answer.objects.create(
-                question=question,
-                text=a['text'],
-                is_correct=a.get('is_correct', False)
-            )
+    open_retake(quiz, request.user)
+    report = import_quiz_questions(quiz, file, incremental=incremental)
+    report_import(request, report)
 
     messages.success(request, "Вопросы готовы, тест готов к повторному прохождению")
     return redirect('take_quiz', quiz_id=quiz.pk)
@@ -303,7 +441,7 @@ def auto_import_and_start_quiz(request, quiz_id):
 def restart_quiz_for_user(request, quiz_id):
     quiz = get_object_or_404(Quiz, pk=quiz_id)
 
-    QuizResult.objects.filter(quiz=quiz, student=request.user).delete()
+    open_retake(quiz, request.user)
 
     messages.success(request, f"Вы можете пройти тест \"{quiz.title}\" повторно")
     return redirect('take_quiz', quiz_id=quiz.id)